@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Compares radius queries with a BKTree and a MultiIndexHash against brute force.
+
+Brute force is measured both as a python loop over ImageHash.__sub__ and as
+the vectorized HashArray.within. The hashes are clustered around a number of
+centers, similar to a collection with near-duplicates.
+
+Usage: python benchmark_bktree.py [number of hashes] [number of queries]
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+
+import numpy
+
+import imagehash
+
+
+def clustered_hashes(rng, count, centers, flips):
+	bits = centers[rng.randint(0, len(centers), size=count)]
+	for _ in range(flips):
+		column = rng.randint(0, 64, size=count)
+		bits[numpy.arange(count), column] ^= rng.rand(count) < 0.5
+	return imagehash.HashArray.from_bool(bits.reshape((count, 8, 8)))
+
+
+def timed(func, queries):
+	start = time.time()
+	results = [func(query) for query in queries]
+	return (time.time() - start) / len(queries), results
+
+
+def main(n, nqueries):
+	rng = numpy.random.RandomState(1)
+	centers = rng.randint(0, 2, size=(max(1, n // 100), 64)).astype(bool)
+	hashes = clustered_hashes(rng, n, centers, 8)
+	queries = list(clustered_hashes(rng, nqueries, centers, 8))
+	start = time.time()
+	tree = imagehash.BKTree(hashes)
+	print('%d hashes, BKTree built in %.2fs' % (n, time.time() - start))
+	start = time.time()
+	mih = imagehash.MultiIndexHash(hashes)
+	print('MultiIndexHash with %d substrings built in %.2fs' % (len(mih._tables), time.time() - start))
+	hash_list = list(hashes[:20000])
+	loop_time, _ = timed(lambda query: [i for i, h in enumerate(hash_list) if query - h <= 6], queries[:10])
+	print('python loop over ImageHash: %.1f ms per query (extrapolated from %d hashes)' % (
+		loop_time * 1000 * n / len(hash_list), len(hash_list)))
+	print('%6s %14s %14s %14s %12s %10s' % ('radius', 'within [ms]', 'BKTree [ms]', 'MIH [ms]', 'candidates', 'matches'))
+	for radius in (0, 2, 4, 6, 8, 12, 16):
+		within_time, expected = timed(lambda query, radius=radius: hashes.within(query, radius), queries)
+		tree_time, found = timed(lambda query, radius=radius: tree.search(query, radius)[0], queries)
+		assert all(set(a) == set(b) for a, b in zip(expected, found))
+		candidates = []
+		for query in queries[:5]:
+			mih.search(query, radius)
+			candidates.append(mih.stats['candidates'])
+		mih_time, found = timed(lambda query, radius=radius: mih.search(query, radius)[0], queries)
+		assert all(set(a) == set(b) for a, b in zip(expected, found))
+		print('%6d %14.2f %14.2f %14.2f %12.0f %10.1f' % (
+			radius, within_time * 1000, tree_time * 1000, mih_time * 1000, numpy.mean(candidates),
+			numpy.mean([len(e) for e in expected])))
+
+
+if __name__ == '__main__':
+	main(
+		int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+		int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+	)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Measures dict insert and lookup throughput with ImageHash keys.
+
+Compares the full-entropy ImageHash.__hash__ with the previous one, which
+folded every hash into 256 values. The previous hash makes dict operations
+quadratic, so it is only run on a small subset.
+
+Usage: python benchmark_hash_dict.py [number of hashes]
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+
+import numpy
+
+import imagehash
+
+
+class ShortImageHash(imagehash.ImageHash):
+	__slots__ = ()
+
+	def __hash__(self):
+		# previous implementation, intentionally shortening the information
+		return sum([2**(i % 8) for i, v in enumerate(self.hash.flatten()) if v])
+
+
+def measure(hashes, label):
+	start = time.time()
+	table = {}
+	for i, image_hash in enumerate(hashes):
+		table[image_hash] = i
+	inserted = time.time()
+	found = sum(1 for image_hash in hashes if image_hash in table)
+	looked_up = time.time()
+	assert found == len(hashes)
+	print('%-28s %9d hashes: %10.0f inserts/s, %10.0f lookups/s' % (
+		label, len(hashes), len(hashes) / (inserted - start), len(hashes) / (looked_up - inserted)))
+
+
+def main(n):
+	rng = numpy.random.RandomState(42)
+	bits = rng.randint(0, 2, size=(n, 8, 8)).astype(bool)
+	hashes = [imagehash.ImageHash(b) for b in bits]
+	measure(hashes, 'full-entropy __hash__')
+	subset = min(n, 20000)
+	measure([ShortImageHash(b) for b in bits[:subset]], '8 bit __hash__ (previous)')
+
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
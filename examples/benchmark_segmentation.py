@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Times the segmentation step of crop_resistant_hash on the test images.
+
+Compares the labeling with scipy.ndimage.label (if installed) and with the numpy union-find,
+and, when run from the repository root, the original set based flood fill
+kept in the tests as reference.
+
+Usage: python examples/benchmark_segmentation.py [segmentation image size]
+"""
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import os
+import sys
+import time
+
+import numpy
+from PIL import Image, ImageFilter
+
+import imagehash
+
+with contextlib.suppress(ImportError):
+	# _connected_components uses scipy.ndimage.label once it is imported
+	import scipy.ndimage  # noqa: F401
+
+try:
+	from tests.test_segmentation import _reference_segments
+except ImportError:
+	_reference_segments = None
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'data')
+
+
+def timed(func, repeat):
+	start = time.time()
+	for _ in range(repeat):
+		func()
+	return (time.time() - start) / repeat * 1000
+
+
+def main(size):
+	print('%-16s %12s %12s %12s %12s' % ('image', 'scipy [ms]', 'numpy [ms]', 'reference', 'segments'))
+	for name in sorted(os.listdir(DATA_DIR)):
+		image = Image.open(os.path.join(DATA_DIR, name)).convert('L').resize((size, size), imagehash.ANTIALIAS)
+		image = image.filter(ImageFilter.GaussianBlur()).filter(ImageFilter.MedianFilter())
+		pixels = numpy.array(image).astype(numpy.float32)
+		segments = imagehash._segment_labels(pixels, 128, 500).max()
+		scipy_time = timed(lambda pixels=pixels: imagehash._segment_labels(pixels, 128, 500), 20)
+		connected_components = imagehash._connected_components
+		imagehash._connected_components = imagehash._union_find_components
+		try:
+			numpy_time = timed(lambda pixels=pixels: imagehash._segment_labels(pixels, 128, 500), 20)
+		finally:
+			imagehash._connected_components = connected_components
+		if _reference_segments is None:
+			reference = 'n/a'
+		else:
+			reference = '%.1f' % timed(lambda pixels=pixels: _reference_segments(pixels, 128, 500), 1)
+		print('%-16s %12.1f %12.1f %12s %12d' % (name, scipy_time, numpy_time, reference, segments))
+
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -1,5 +1,5 @@
 import numpy
-from PIL import Image, ImageFilter
+from PIL import Image
 
 import imagehash
 
@@ -22,18 +22,13 @@ RAINBOW = [
 
 # Load image
 full_image = Image.open(IMAGE_FILE)
-width, height = full_image.size
-# Image pre-processing
-image = full_image.convert('L').resize((IMG_SIZE, IMG_SIZE), Image.ANTIALIAS)
-# Add filters
-image = image.filter(ImageFilter.GaussianBlur()).filter(ImageFilter.MedianFilter())
-pixels = numpy.array(image).astype(numpy.float32)
 # Split segments
-segments = imagehash._find_all_segments(pixels, SEGMENT_THRESHOLD, MIN_SEGMENT_SIZE)
-# Change back to RGB
-image = image.convert('RGB')
+segmentation = imagehash.segment_image(full_image, SEGMENT_THRESHOLD, MIN_SEGMENT_SIZE, IMG_SIZE)
+# Gray scale image at the segmentation size, in RGB
+image = full_image.convert('L').resize((IMG_SIZE, IMG_SIZE), imagehash.ANTIALIAS).convert('RGB')
+pixels = numpy.array(image)
 # Colour in segments
-for num, segment in enumerate(segments):
-	for x, y in segment:
-		image.putpixel((y, x), RAINBOW[num % len(RAINBOW)])
+for num in range(len(segmentation)):
+	pixels[segmentation.labels == num + 1] = RAINBOW[num % len(RAINBOW)]
+image = Image.fromarray(pixels)
 image.show()
@@ -1,53 +1,227 @@
 #!/usr/bin/env python
+"""
+Demo of hashing
+
+Walks the given directories recursively, hashes the images in a pool of worker
+processes (or threads) and reports each image whose hash was already seen as
+soon as it is hashed. With --threshold, near-duplicates are reported instead,
+once all images are hashed.
+"""
 from __future__ import absolute_import, division, print_function
 
-from PIL import Image
+import argparse
+import collections
+import os
+import sys
+import threading
+import time
+from concurrent import futures
 
 import imagehash
+import imagehash.cache
+import imagehash.neighbors
 
-"""
-Demo of hashing
-"""
+# hash functions and their keyword arguments by method name. Workers look them up
+# by name, so that only the name has to be sent to worker processes.
+HASH_METHODS = {
+	'ahash': (imagehash.average_hash, {}),
+	'phash': (imagehash.phash, {}),
+	'dhash': (imagehash.dhash, {}),
+	'whash-haar': (imagehash.whash, {}),
+	'whash-db4': (imagehash.whash, {'mode': 'db4'}),
+	'colorhash': (imagehash.colorhash, {}),
+	'crop-resistant': (imagehash.crop_resistant_hash, {}),
+}
+
+# the hash cache of each worker thread (or process)
+_local = threading.local()
 
 
-def find_similar_images(userpaths, hashfunc=imagehash.average_hash):
-	def is_image(filename):
-		f = filename.lower()
-		return f.endswith('.png') or f.endswith('.jpg') or \
-			f.endswith('.jpeg') or f.endswith('.bmp') or \
-			f.endswith('.gif') or '.jpg' in f or f.endswith('.svg')
+def is_image(filename):
+	f = filename.lower()
+	return f.endswith('.png') or f.endswith('.jpg') or \
+		f.endswith('.jpeg') or f.endswith('.bmp') or \
+		f.endswith('.gif') or '.jpg' in f or f.endswith('.svg')
 
-	image_filenames = []
+
+def iter_image_paths(userpaths):
+	"""
+	Yields the paths of the images in @userpaths and all their subdirectories,
+	in sorted order within each directory. Symbolic links to directories are not followed.
+	"""
 	for userpath in userpaths:
-		image_filenames += [os.path.join(userpath, path) for path in os.listdir(userpath) if is_image(path)]
-	images = {}
-	for img in sorted(image_filenames):
-		try:
-			hash = hashfunc(Image.open(img))
-		except Exception as e:
-			print('Problem:', e, 'with', img)
-			continue
-		if hash in images:
-			print(img, '  already exists as', ' '.join(images[hash]))
-			if 'dupPictures' in img:
-				print('rm -v', img)
-		images[hash] = images.get(hash, []) + [img]
+		directories = [userpath]
+		while directories:
+			directory = directories.pop()
+			try:
+				with os.scandir(directory) as it:
+					entries = sorted(it, key=lambda entry: entry.name)
+			except OSError as e:
+				print('Problem:', e, 'with', directory)
+				continue
+			subdirectories = []
+			for entry in entries:
+				if entry.is_dir(follow_symlinks=False):
+					subdirectories.append(entry.path)
+				elif is_image(entry.name):
+					yield entry.path
+			directories += reversed(subdirectories)
+
+
+def open_cache(cache_path):
+	"""
+	Returns the hash cache at @cache_path of the calling thread, which is opened on first use.
+	"""
+	cache = getattr(_local, 'cache', None)
+	if cache is None or cache.path != cache_path:
+		cache = _local.cache = imagehash.cache.HashCache(cache_path)
+	return cache
+
+
+def hash_image(path, hashmethod, cache_path=None, exact=True):
+	"""
+	Hashes the image file at @path with the method named @hashmethod (or the hash
+	function @hashmethod), or takes the hash from the hash cache at @cache_path,
+	if given and the file did not change.
+	@exact decodes the whole image; otherwise large JPEGs are decoded at reduced size,
+	which is faster, but may change a few bits (see imagehash.hash_file).
+	Returns (path, hash, None), or (path, None, error message) if the file could not be hashed.
+	"""
+	if callable(hashmethod):
+		hashfunc, kwargs = hashmethod, {}
+	else:
+		hashfunc, kwargs = HASH_METHODS[hashmethod]
+	try:
+		if cache_path is not None:
+			return path, open_cache(cache_path).hash_file(path, hashfunc, exact=exact, **kwargs), None
+		return path, imagehash.hash_file(path, hashfunc, exact=exact, **kwargs), None
+	except Exception as e:
+		return path, None, str(e)
 
-	# for k, img_list in six.iteritems(images):
-	# 	if len(img_list) > 1:
-	# 		print(" ".join(img_list))
 
+def imap(executor, func, items, max_pending):
+	"""
+	Yields func(*item) for each of @items, computed by @executor, in the order of @items,
+	so that the results do not depend on how the work is scheduled.
+	At most @max_pending items are submitted at any time, so that @items can be a long stream.
+	"""
+	pending = collections.deque()
+	for item in items:
+		if len(pending) >= max_pending:
+			yield pending.popleft().result()
+		pending.append(executor.submit(func, *item))
+	while pending:
+		yield pending.popleft().result()
 
-if __name__ == '__main__':  # noqa: C901
-	import os
-	import sys
 
-	def usage():
-		sys.stderr.write("""SYNOPSIS: %s [ahash|phash|dhash|...] [<directory>]
+class Throughput:
+	"""
+	Reports the number of images hashed and the rate to stderr, every @interval seconds.
+	"""
 
-Identifies similar images in the directory.
+	def __init__(self, interval=10.0):
+		self.interval = interval
+		self.start = self.last_report = time.time()
+		self.count = 0
 
-Method:
+	def update(self):
+		self.count += 1
+		now = time.time()
+		if self.interval > 0 and now - self.last_report >= self.interval:
+			self.last_report = now
+			self.report()
+
+	def report(self):
+		elapsed = max(time.time() - self.start, 1e-9)
+		sys.stderr.write('%d images hashed in %.1fs (%.1f images/s)\n' % (self.count, elapsed, self.count / elapsed))
+
+
+def hash_images(userpaths, hashmethod='ahash', workers=None, threads=False, cache_path=None, fast_decode=False):
+	"""
+	Yields (path, hash, error message) for each image in @userpaths (see hash_image),
+	in the order of iter_image_paths, so the first of several equal images is always the same.
+
+	@hashmethod method name, or hash function; worker processes need a function
+	they can import, such as imagehash.phash.
+	@workers number of worker processes (or threads, if @threads), by default one per CPU.
+	With 0 workers, the images are hashed one after the other in this process.
+	@cache_path hash cache database, which each worker reads and updates.
+	@fast_decode decodes large JPEGs at reduced size.
+	"""
+	jobs = ((path, hashmethod, cache_path, not fast_decode) for path in iter_image_paths(userpaths))
+	if workers == 0:
+		for job in jobs:
+			yield hash_image(*job)
+		return
+	executor_class = futures.ThreadPoolExecutor if threads else futures.ProcessPoolExecutor
+	with executor_class(max_workers=workers) as executor:
+		# a few jobs per worker keep all workers busy, without queuing up the whole directory tree
+		max_pending = 4 * (workers or os.cpu_count() or 1)
+		yield from imap(executor, hash_image, jobs, max_pending)
+
+
+def find_near_duplicates(hashed, threshold):
+	"""
+	Groups the (path, hash) pairs @hashed into clusters of hashes at most @threshold bits
+	apart (see imagehash.neighbors.cluster_hashes), and reports each image of a cluster with the
+	images before it. Returns a dict from the hash of the first image of each cluster to its paths.
+	The images are taken in the order of their paths, so the first image of a cluster (which
+	is kept by the suggested deletions) does not depend on the order of @hashed.
+	"""
+	hashed = sorted(hashed, key=lambda item: item[0])
+	images = {}
+	if not hashed:
+		return images
+	labels = imagehash.neighbors.cluster_hashes([hash for path, hash in hashed], threshold)
+	for (path, _), label in zip(hashed, labels):
+		first = hashed[label][1]
+		if first in images:
+			print(path, '  is similar to', ' '.join(images[first]))
+			if 'dupPictures' in path:
+				print('rm -v', path)
+			images[first].append(path)
+		else:
+			images[first] = [path]
+	return images
+
+
+def find_similar_images(
+	userpaths, hashfunc=imagehash.average_hash, workers=None, threads=False, progress_interval=10.0,
+	cache_path=None, threshold=None, fast_decode=False,
+):
+	"""
+	Hashes the images in @userpaths with @hashfunc (a hash function, or a method
+	name, see HASH_METHODS), and reports the images with the same hash as
+	an image before them. With a @threshold, images whose hashes are at most that
+	many bits apart are reported once all images are hashed (see find_near_duplicates).
+	"""
+	throughput = Throughput(progress_interval)
+	images = {}
+	hashed = []
+	for path, hash, error in hash_images(userpaths, hashfunc, workers, threads, cache_path, fast_decode):
+		throughput.update()
+		if error is not None:
+			print('Problem:', error, 'with', path)
+			continue
+		if threshold is not None:
+			hashed.append((path, hash))
+		elif hash in images:
+			print(path, '  already exists as', ' '.join(images[hash]))
+			if 'dupPictures' in path:
+				print('rm -v', path)
+			images[hash].append(path)
+		else:
+			images[hash] = [path]
+	throughput.report()
+	if threshold is not None:
+		return find_near_duplicates(hashed, threshold)
+	return images
+
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='Identifies similar images in the directories (and their subdirectories).',
+		epilog="""Method:
   ahash:          Average hash
   phash:          Perceptual hash
   dhash:          Difference hash
@@ -56,27 +230,34 @@ Method:
   colorhash:      HSV color hash
   crop-resistant: Crop-resistant hash
 
-(C) Johannes Buchner, 2013-2017
-""" % sys.argv[0])
-		sys.exit(1)
-
-	hashmethod = sys.argv[1] if len(sys.argv) > 1 else usage()
-	if hashmethod == 'ahash':
-		hashfunc = imagehash.average_hash
-	elif hashmethod == 'phash':
-		hashfunc = imagehash.phash
-	elif hashmethod == 'dhash':
-		hashfunc = imagehash.dhash
-	elif hashmethod == 'whash-haar':
-		hashfunc = imagehash.whash
-	elif hashmethod == 'whash-db4':
-		def hashfunc(img):
-			return imagehash.whash(img, mode='db4')
-	elif hashmethod == 'colorhash':
-		hashfunc = imagehash.colorhash
-	elif hashmethod == 'crop-resistant':
-		hashfunc = imagehash.crop_resistant_hash
-	else:
-		usage()
-	userpaths = sys.argv[2:] if len(sys.argv) > 2 else '.'
-	find_similar_images(userpaths=userpaths, hashfunc=hashfunc)
+(C) Johannes Buchner, 2013-2017""",
+		formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('hashmethod', choices=sorted(HASH_METHODS), metavar='method', help='hash method, see below')
+	parser.add_argument('directories', nargs='*', default=['.'], help='directories to search (default: current directory)')
+	parser.add_argument(
+		'--workers', type=int, default=None,
+		help='number of worker processes (default: one per CPU; 0 hashes in the main process)')
+	parser.add_argument('--threads', action='store_true', help='use worker threads instead of processes')
+	parser.add_argument(
+		'--cache', metavar='FILE',
+		help='keep the hashes in this database, and only hash new or modified images on the next run')
+	parser.add_argument(
+		'--progress', type=float, default=10.0, metavar='SECONDS',
+		help='report the throughput every SECONDS seconds to stderr (default: 10; 0 only reports at the end)')
+	parser.add_argument(
+		'--threshold', type=int, metavar='BITS',
+		help='report images whose hashes differ in at most BITS bits, instead of only equal hashes')
+	parser.add_argument(
+		'--fast-decode', action='store_true',
+		help='decode large JPEGs at reduced size, which is faster, but may change a few bits of the hashes')
+	args = parser.parse_args()
+	if args.threshold is not None and args.hashmethod == 'crop-resistant':
+		parser.error('--threshold does not support crop-resistant hashes')
+	find_similar_images(
+		args.directories, args.hashmethod, workers=args.workers, threads=args.threads,
+		progress_interval=args.progress, cache_path=args.cache, threshold=args.threshold,
+		fast_decode=args.fast_decode)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,142 @@
+"""
+Batched hash computation
+
+The functions in this module mirror average_hash, dhash, phash and colorhash, but take a
+whole list of images and compute all hashes in one vectorized numpy pass.
+The hashes are returned as a HashArray, and each of them is bit-identical to
+the result of the corresponding single image function.
+
+Example:
+
+>>> from PIL import Image
+>>> import imagehash.batch
+>>> images = [Image.open('tests/data/imagehash.png'), Image.open('tests/data/peppers.png')]
+>>> hashes = imagehash.batch.average_hash(images)
+>>> len(hashes)
+2
+>>> hashes[0] == imagehash.average_hash(images[0])
+True
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from typing import TYPE_CHECKING
+
+import numpy
+
+import imagehash
+from imagehash import _phash_bits
+from imagehash.hasharray import HashArray
+
+if TYPE_CHECKING:
+	from PIL import Image  # noqa: F401
+
+	from imagehash import MeanFunc  # noqa: F401
+
+
+def _reduce_images(images, size):
+	# type: (list | numpy.ndarray, tuple[int, int]) -> numpy.ndarray
+	"""
+	internal function to turn a list of images into a N x height x width stack of
+	grayscale grids of the requested (width, height) size.
+
+	@images may also be a N x height x width uint8 array of already reduced grids,
+	which is used as-is. Other dtypes are refused, as they would be quantized
+	differently from the grayscale images.
+	"""
+	width, height = size
+	if isinstance(images, numpy.ndarray):
+		if images.ndim != 3 or images.shape[1:] != (height, width):
+			emsg = 'Expected reduced grids of shape (N, {}, {}), got {}.'
+			raise ValueError(emsg.format(height, width, images.shape))
+		if images.dtype != numpy.uint8:
+			raise ValueError('Expected reduced grids of dtype uint8, got {}.'.format(images.dtype))
+		return images
+	grids = [imagehash._resized_gray(image, size) for image in images]
+	if not grids:
+		return numpy.zeros((0, height, width), dtype=numpy.uint8)
+	return numpy.stack(grids)
+
+
+def _reduce_stack(stack, func):
+	# type: (numpy.ndarray, MeanFunc) -> numpy.ndarray
+	"""
+	internal function to compute func (such as numpy.mean or numpy.median) for each
+	grid in a N x height x width stack, returning an array broadcastable against it.
+	"""
+	if func is numpy.mean or func is numpy.median:
+		values = func(stack, axis=(1, 2))
+	else:
+		values = numpy.array([func(grid) for grid in stack])
+	return values.reshape((-1, 1, 1))
+
+
+def average_hash(images, hash_size=8, mean=numpy.mean):
+	# type: (list[Image.Image] | numpy.ndarray, int, MeanFunc) -> HashArray
+	"""
+	Average Hash computation for a batch of images.
+
+	@images list of PIL instances (or pixel arrays), or a N x hash_size x hash_size uint8 array of already reduced grids.
+	@mean how to determine the average luminescence. can try numpy.median instead.
+
+	Returns a HashArray, whose i-th hash equals average_hash(images[i]).
+	"""
+	if hash_size < 2:
+		raise ValueError('Hash size must be greater than or equal to 2')
+
+	pixels = _reduce_images(images, (hash_size, hash_size))
+	return HashArray.from_bool(pixels > _reduce_stack(pixels, mean))
+
+
+def phash(images, hash_size=8, highfreq_factor=4):
+	# type: (list[Image.Image] | numpy.ndarray, int, int) -> HashArray
+	"""
+	Perceptual Hash computation for a batch of images.
+
+	@images list of PIL instances (or pixel arrays), or a N x img_size x img_size uint8 array of already reduced grids,
+	where img_size = hash_size * highfreq_factor.
+
+	Returns a HashArray, whose i-th hash equals phash(images[i]).
+	"""
+	if hash_size < 2:
+		raise ValueError('Hash size must be greater than or equal to 2')
+
+	img_size = hash_size * highfreq_factor
+	pixels = _reduce_images(images, (img_size, img_size))
+	# a single batched matrix product over all images
+	return HashArray.from_bool(_phash_bits(pixels, hash_size))
+
+
+def dhash(images, hash_size=8):
+	# type: (list[Image.Image] | numpy.ndarray, int) -> HashArray
+	"""
+	Difference Hash computation for a batch of images.
+
+	@images list of PIL instances (or pixel arrays), or a N x hash_size x (hash_size + 1) uint8 array of already reduced grids.
+
+	Returns a HashArray, whose i-th hash equals dhash(images[i]).
+	"""
+	if hash_size < 2:
+		raise ValueError('Hash size must be greater than or equal to 2')
+
+	pixels = _reduce_images(images, (hash_size + 1, hash_size))
+	# compute differences between columns
+	return HashArray.from_bool(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+
+def colorhash(images, binbits=3, sample_size=None):
+	# type: (list[Image.Image], int, int | None) -> HashArray
+	"""
+	Color Hash computation for a batch of images.
+
+	@images list of PIL instances (or pixel arrays).
+	@binbits number of bits to use to encode each pixel fractions
+	@sample_size if given, estimate the fractions from about @sample_size pixels along the
+	longer image side (see colorhash).
+
+	Returns a HashArray, whose i-th hash equals colorhash(images[i]).
+	"""
+	rows = [imagehash._colorhash_counts(image, sample_size) for image in images]
+	# the fractions and bits of all images are computed at once
+	counts = numpy.stack(rows) if rows else numpy.zeros((0, 15))
+	return HashArray.from_bool(imagehash._colorhash_bits(counts, binbits))
@@ -0,0 +1,226 @@
+"""
+Persistent cache of image file hashes
+
+A HashCache stores the hashes of image files in an SQLite database, by file
+path and hash algorithm. A cached hash is only used while the file has the
+same size and modification time (and optionally the same content digest) as
+when it was hashed, so that hashing a directory again only decodes the new and
+modified files.
+
+The database uses write-ahead logging, so several processes, each with its own
+HashCache (e.g. the workers of a process pool), can read and write it at the
+same time. Writers wait up to @timeout seconds for each other.
+
+Hashes cached by a version of imagehash whose hashes differ (see HASH_VERSION)
+are not used, and are replaced when the file is hashed again.
+
+Example:
+
+>>> import imagehash, imagehash.cache
+>>> with imagehash.cache.HashCache('hashes.sqlite') as cache:
+...     image_hash = cache.hash_file('tests/data/peppers.png', imagehash.phash)
+...     image_hash == cache.get('tests/data/peppers.png', 'phash')
+True
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import TYPE_CHECKING
+
+import imagehash
+
+if TYPE_CHECKING:
+	from typing import Any, Iterable  # noqa: F401
+
+# Increase whenever a change of the library changes the output of a hash function,
+# so that hashes cached before are not used anymore.
+HASH_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+	path TEXT NOT NULL,
+	algorithm TEXT NOT NULL,
+	size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	digest TEXT,
+	version INTEGER NOT NULL,
+	shape TEXT NOT NULL,
+	segments INTEGER,
+	hash BLOB NOT NULL,
+	PRIMARY KEY (path, algorithm)
+)
+"""
+
+
+def _json_default(value):
+	# type: (Any) -> str
+	# functions (such as mean=numpy.median) are identified by their name
+	return '{}.{}'.format(getattr(value, '__module__', ''), getattr(value, '__qualname__', repr(value)))
+
+
+def algorithm_key(hash_func, **kwargs):
+	# type: (imagehash.HashFunc | str, Any) -> str
+	"""
+	Returns the name under which hashes of @hash_func with the keyword arguments
+	@kwargs are cached, e.g. 'whash {"mode": "db4"}'.
+	"""
+	name = hash_func if isinstance(hash_func, str) else hash_func.__name__
+	if not kwargs:
+		return name
+	return name + ' ' + json.dumps(kwargs, sort_keys=True, default=_json_default)
+
+
+def _file_digest(path):
+	# type: (str) -> str
+	digest = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def _pack(image_hash):
+	# type: (imagehash.ImageHash | imagehash.ImageMultiHash) -> tuple[str, int | None, bytes]
+	"""
+	internal function returning the shape, number of segments (None for an ImageHash)
+	and packed bits of @image_hash.
+	"""
+	if isinstance(image_hash, imagehash.ImageMultiHash):
+		hashes, segments = image_hash.segment_hashes, len(image_hash.segment_hashes)
+	else:
+		hashes, segments = [image_hash], None
+	shape = hashes[0]._shape if hashes else ()
+	nbytes = (hashes[0]._size + 7) // 8 if hashes else 0
+	packed = b''.join(segment_hash._value.to_bytes(nbytes, 'big') for segment_hash in hashes)
+	return ','.join(str(length) for length in shape), segments, packed
+
+
+def _unpack(shape, segments, packed):
+	# type: (str, int | None, bytes) -> imagehash.ImageHash | imagehash.ImageMultiHash
+	"""
+	internal function, the inverse of _pack.
+	"""
+	dims = tuple(int(length) for length in shape.split(',')) if shape else ()
+	nbytes = len(packed) // segments if segments else len(packed)
+	hashes = [
+		imagehash.ImageHash._from_value(int.from_bytes(packed[start:start + nbytes], 'big'), dims)
+		for start in range(0, len(packed), nbytes or 1)
+	]
+	if segments is None:
+		return hashes[0]
+	return imagehash.ImageMultiHash(hashes)
+
+
+class HashCache:
+	"""
+	Cache of image file hashes in the SQLite database at @path, which is created if needed.
+
+	@digest if True, a cached hash is also only used if the SHA-256 digest of the file
+	contents is unchanged. This detects changes that keep the file size and modification
+	time, but reads every file on lookup.
+	@timeout how many seconds to wait for other processes writing to the database.
+
+	A HashCache must only be used by the thread which created it; other threads and
+	processes should create their own.
+	"""
+
+	def __init__(self, path, digest=False, timeout=60.0):
+		# type: (str, bool, float) -> None
+		self.path = path
+		self.digest = digest
+		self._connection = sqlite3.connect(path, timeout=timeout)
+		self._connection.execute('PRAGMA journal_mode=WAL')
+		# with write-ahead logging, commits are durable at checkpoints, which is enough for a cache
+		self._connection.execute('PRAGMA synchronous=NORMAL')
+		with self._connection:
+			self._connection.execute(_SCHEMA)
+
+	def file_key(self, path):
+		# type: (str) -> tuple[str, int, int, str | None]
+		"""
+		Returns (absolute path, size, modification time in ns, digest or None) of the file at @path,
+		which identifies its current contents. Take it before hashing the file, so that
+		changes made while hashing are noticed.
+		"""
+		path = os.path.abspath(path)
+		stat = os.stat(path)
+		return path, stat.st_size, stat.st_mtime_ns, _file_digest(path) if self.digest else None
+
+	def lookup(self, key, algorithm):
+		# type: (tuple[str, int, int, str | None], str) -> imagehash.ImageHash | imagehash.ImageMultiHash | None
+		"""
+		Returns the cached hash of the file identified by @key (see file_key) for @algorithm
+		(see algorithm_key), or None if there is none for these file contents.
+		"""
+		path, size, mtime_ns, digest = key
+		row = self._connection.execute(
+			'SELECT size, mtime_ns, digest, version, shape, segments, hash FROM hashes WHERE path = ? AND algorithm = ?',
+			(path, algorithm)).fetchone()
+		if row is None or row[:2] != (size, mtime_ns) or row[3] != HASH_VERSION:
+			return None
+		if digest is not None and row[2] != digest:
+			return None
+		return _unpack(*row[4:])
+
+	def get(self, path, algorithm):
+		# type: (str, str) -> imagehash.ImageHash | imagehash.ImageMultiHash | None
+		"""
+		Returns the cached hash of the file at @path for @algorithm (see algorithm_key), if it is up to date.
+		"""
+		return self.lookup(self.file_key(path), algorithm)
+
+	def store(self, key, algorithm, image_hash):
+		# type: (tuple[str, int, int, str | None], str, imagehash.ImageHash | imagehash.ImageMultiHash) -> None
+		"""
+		Caches @image_hash, computed with @algorithm (see algorithm_key) of the file identified by @key (see file_key).
+		"""
+		self.store_many([(key, algorithm, image_hash)])
+
+	def store_many(self, entries):
+		# type: (Iterable[tuple[tuple[str, int, int, str | None], str, imagehash.ImageHash | imagehash.ImageMultiHash]]) -> None
+		"""
+		Caches several (key, algorithm, image_hash) entries (see store) in one transaction.
+		"""
+		rows = [key + (algorithm, HASH_VERSION) + _pack(image_hash) for key, algorithm, image_hash in entries]
+		with self._connection:
+			self._connection.executemany(
+				'INSERT OR REPLACE INTO hashes (path, size, mtime_ns, digest, algorithm, version, shape, segments, hash) '
+				'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+	def hash_file(self, path, hash_func=imagehash.average_hash, exact=True, **kwargs):
+		# type: (str, imagehash.HashFunc, bool, Any) -> imagehash.ImageHash | imagehash.ImageMultiHash
+		"""
+		Returns imagehash.hash_file(@path, @hash_func, @exact, **@kwargs), from the cache if
+		the file has not changed since, and otherwise computes and caches it.
+
+		Unlike imagehash.hash_file, the whole image is decoded by default. Hashes of
+		images decoded at reduced size (@exact=False) may differ in a few bits, so they
+		are cached under their own algorithm key, e.g. 'phash {"exact": false}'.
+		"""
+		key = self.file_key(path)
+		if exact:
+			algorithm = algorithm_key(hash_func, **kwargs)
+		else:
+			algorithm = algorithm_key(hash_func, exact=False, **kwargs)
+		image_hash = self.lookup(key, algorithm)
+		if image_hash is None:
+			image_hash = imagehash.hash_file(path, hash_func, exact=exact, **kwargs)
+			self.store(key, algorithm, image_hash)
+		return image_hash
+
+	def __len__(self):
+		return self._connection.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+
+	def close(self):
+		# type: () -> None
+		self._connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
@@ -0,0 +1,288 @@
+"""
+Columnar storage of many hashes
+
+A HashArray keeps N hashes of the same shape in one contiguous matrix of packed
+bits, so that a query hash is compared against all of them with a few
+vectorized XOR and popcount operations instead of a python loop.
+
+Example:
+
+>>> from PIL import Image
+>>> import imagehash
+>>> images = [Image.open('tests/data/imagehash.png'), Image.open('tests/data/peppers.png')]
+>>> hashes = imagehash.HashArray([imagehash.average_hash(image) for image in images])
+>>> hashes.distances(imagehash.average_hash(images[1]))
+array([33,  0], dtype=int32)
+>>> hashes[1] == imagehash.average_hash(images[1])
+True
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import math
+from typing import TYPE_CHECKING
+
+import numpy
+
+from imagehash import ImageHash, _bitwise_count, hex_to_hashes
+
+if TYPE_CHECKING:
+	from typing import Iterable, Iterator  # noqa: F401
+
+# number of rows compared at once, which bounds the size of temporary arrays
+BLOCK_SIZE = 1 << 16
+
+
+class HashArray:
+	"""
+	Array of hashes of the same shape, stored as a matrix of packed bits.
+
+	Each row holds the bits of one hash as a big-endian number (the same order
+	as in the hex string), padded at the front to whole 64 bit words.
+	Indexing with an integer returns an ImageHash, slicing returns a HashArray
+	sharing the memory of this one.
+	"""
+
+	def __init__(self, hashes=(), hash_shape=None):
+		# type: (Iterable[ImageHash], tuple[int, ...] | None) -> None
+		"""
+		@hashes ImageHash objects (or another HashArray) to fill the array with.
+		@hash_shape shape of the hashes; taken from the first hash if not given.
+		"""
+		self.hash_shape = None  # type: tuple[int, ...] | None
+		self.nbits = 0
+		self._data = numpy.zeros((0, 0), dtype=numpy.uint8)
+		self._length = 0
+		if hash_shape is not None:
+			self._set_shape(hash_shape)
+		self.extend(hashes)
+
+	def _set_shape(self, hash_shape):
+		# type: (tuple[int, ...]) -> None
+		self.hash_shape = tuple(hash_shape)
+		self.nbits = int(numpy.prod(hash_shape))
+		self._nbytes = (self.nbits + 7) // 8
+		self._width = (self.nbits + 63) // 64 * 8
+		self._data = numpy.zeros((0, self._width), dtype=numpy.uint8)
+
+	@classmethod
+	def _wrap(cls, data, hash_shape):
+		# type: (numpy.ndarray, tuple[int, ...]) -> HashArray
+		"""
+		internal constructor using @data (rows padded to whole words) without copying.
+		"""
+		self = cls(hash_shape=hash_shape)
+		self._data = data
+		self._length = len(data)
+		return self
+
+	@classmethod
+	def from_packed(cls, packed, hash_shape):
+		# type: (numpy.ndarray, tuple[int, ...]) -> HashArray
+		"""
+		Creates a HashArray from a N x nbytes uint8 array of packed hashes, as
+		returned by hex_to_hashes or HashArray.packed.
+
+		If the rows are already padded to whole 64 bit words, the array is used
+		without copying, so it may also be a numpy.memmap.
+		"""
+		self = cls(hash_shape=hash_shape)
+		packed = numpy.asarray(packed)
+		if packed.dtype != numpy.uint8 or packed.ndim != 2 or packed.shape[1] not in (self._nbytes, self._width):
+			emsg = 'Expected a uint8 array of shape (N, {}) for hashes of shape {}, got {} {}.'
+			raise ValueError(emsg.format(self._nbytes, self.hash_shape, packed.dtype, packed.shape))
+		if packed.shape[1] == self._width and packed.strides[1] == 1:
+			return cls._wrap(packed, hash_shape)
+		data = numpy.zeros((len(packed), self._width), dtype=numpy.uint8)
+		data[:, self._width - packed.shape[1]:] = packed
+		return cls._wrap(data, hash_shape)
+
+	@classmethod
+	def from_bool(cls, bits):
+		# type: (numpy.ndarray) -> HashArray
+		"""
+		Creates a HashArray from a boolean array, where bits[i] is the .hash array of the i-th hash.
+		"""
+		bits = numpy.asarray(bits, dtype=bool)
+		self = cls(hash_shape=bits.shape[1:])
+		flat = bits.reshape((len(bits), self.nbits))
+		padding = numpy.zeros((len(bits), self._width * 8 - self.nbits), dtype=bool)
+		return cls._wrap(numpy.packbits(numpy.hstack((padding, flat)), axis=1), bits.shape[1:])
+
+	@classmethod
+	def from_hex(cls, hexstrs, hashsize=None):
+		# type: (list[str], int | None) -> HashArray
+		"""
+		Creates a HashArray from stored hashes (hex, as retrieved from str(ImageHash)).
+
+		@hashsize as in hex_to_flathash. If None, the hashes are square as in hex_to_hash.
+		"""
+		hexstrs = list(hexstrs)
+		if not hexstrs:
+			return cls()
+		packed = hex_to_hashes(hexstrs, hashsize)
+		length = len(hexstrs[0])
+		if hashsize is None:
+			hash_size = int(math.sqrt(length * 4))
+			hash_shape = (hash_size, hash_size)
+		else:
+			hash_shape = (1, int(length * 4 / hashsize) * hashsize)
+		return cls.from_packed(packed, hash_shape)
+
+	@property
+	def packed(self):
+		# type: () -> numpy.ndarray
+		"""
+		The hashes as N x nbytes uint8 array, in the layout of hex_to_hashes.
+		"""
+		return self._data[:self._length, self._width - self._nbytes:]
+
+	def _words(self):
+		# type: () -> numpy.ndarray
+		return self._data[:self._length].view(numpy.uint64)
+
+	def _query_words(self, query):
+		# type: (ImageHash) -> numpy.ndarray
+		if query is None:
+			raise TypeError('Other hash must not be None.')
+		if len(query) != self.nbits:
+			raise TypeError('ImageHashes must be of the same shape.', self.hash_shape, query._shape)
+		return numpy.frombuffer(query._value.to_bytes(self._width, 'big'), dtype=numpy.uint8).view(numpy.uint64)
+
+	def _reserve(self, length):
+		# type: (int) -> None
+		"""
+		internal function growing the storage to hold at least @length hashes.
+		Storage grows geometrically, so that appending one by one is cheap.
+		"""
+		if length <= len(self._data):
+			return
+		capacity = max(length, 2 * len(self._data), 16)
+		data = numpy.zeros((capacity, self._width), dtype=numpy.uint8)
+		data[:self._length] = self._data[:self._length]
+		self._data = data
+
+	def append(self, image_hash):
+		# type: (ImageHash) -> None
+		self.extend([image_hash])
+
+	def extend(self, hashes):
+		# type: (Iterable[ImageHash]) -> None
+		if isinstance(hashes, HashArray):
+			if hashes.hash_shape is None:
+				return
+			if self.hash_shape is None:
+				self._set_shape(hashes.hash_shape)
+			if hashes.nbits != self.nbits:
+				raise TypeError('ImageHashes must be of the same shape.', self.hash_shape, hashes.hash_shape)
+			rows = hashes._data[:len(hashes)]
+		else:
+			hashes = list(hashes)
+			if not hashes:
+				return
+			if self.hash_shape is None:
+				self._set_shape(hashes[0]._shape)
+			if any(len(image_hash) != self.nbits for image_hash in hashes):
+				raise TypeError('ImageHashes must be of the same shape.', self.hash_shape)
+			packed = b''.join([image_hash._value.to_bytes(self._width, 'big') for image_hash in hashes])
+			rows = numpy.frombuffer(packed, dtype=numpy.uint8).reshape((len(hashes), self._width))
+		self._reserve(self._length + len(rows))
+		self._data[self._length:self._length + len(rows)] = rows
+		self._length += len(rows)
+
+	def __len__(self):
+		return self._length
+
+	def __getitem__(self, key):
+		rows = self._data[:self._length][key]
+		if rows.ndim == 1:
+			return ImageHash._from_value(int.from_bytes(rows.tobytes(), 'big'), self.hash_shape)
+		return HashArray._wrap(rows, self.hash_shape)
+
+	def __iter__(self):
+		for i in range(self._length):
+			yield self[i]
+
+	def __repr__(self):
+		return 'HashArray(<{} hashes of shape {}>)'.format(self._length, self.hash_shape)
+
+	def to_bool(self):
+		# type: () -> numpy.ndarray
+		"""
+		Returns the hashes as boolean array of shape (N,) + hash_shape.
+		"""
+		if self.hash_shape is None:
+			return numpy.zeros(0, dtype=bool)
+		bits = numpy.unpackbits(self._data[:self._length], axis=1)[:, self._width * 8 - self.nbits:]
+		return bits.view(bool).reshape((self._length,) + self.hash_shape)
+
+	def _block_distances(self, query):
+		# type: (ImageHash) -> Iterator[tuple[int, numpy.ndarray]]
+		"""
+		internal generator yielding (start index, Hamming distances) for blocks of rows.
+		"""
+		if self._length == 0:
+			return
+		query_words = self._query_words(query)
+		words = self._words()
+		for start in range(0, self._length, BLOCK_SIZE):
+			block = words[start:start + BLOCK_SIZE]
+			yield start, _bitwise_count(block ^ query_words).sum(axis=1, dtype=numpy.int32)
+
+	def distances(self, query):
+		# type: (ImageHash) -> numpy.ndarray
+		"""
+		Returns the Hamming distances of @query to all hashes, as with ImageHash.__sub__.
+		"""
+		out = numpy.zeros(self._length, dtype=numpy.int32)
+		for start, distances in self._block_distances(query):
+			out[start:start + len(distances)] = distances
+		return out
+
+	def within(self, query, radius):
+		# type: (ImageHash, int) -> numpy.ndarray
+		"""
+		Returns the (ascending) indices of the hashes at most @radius bits away from @query.
+		"""
+		indices = [numpy.flatnonzero(distances <= radius) + start for start, distances in self._block_distances(query)]
+		return numpy.concatenate(indices) if indices else numpy.zeros(0, dtype=numpy.intp)
+
+	def topk(self, query, k):
+		# type: (ImageHash, int) -> tuple[numpy.ndarray, numpy.ndarray]
+		"""
+		Returns the indices and distances of the @k hashes nearest to @query,
+		ordered by distance (and by index for equal distances).
+		"""
+		candidates = []
+		candidate_distances = []
+		for start, distances in self._block_distances(query):
+			if 0 < k < len(distances):
+				# keep the k nearest of the block, taking the lowest indices among ties
+				kth = numpy.partition(distances, k - 1)[k - 1]
+				nearer = numpy.flatnonzero(distances < kth)
+				tied = numpy.flatnonzero(distances == kth)[:k - len(nearer)]
+				nearest = numpy.concatenate((nearer, tied))
+			else:
+				nearest = numpy.arange(min(k, len(distances)))
+			candidates.append(nearest + start)
+			candidate_distances.append(distances[nearest])
+		if not candidates:
+			return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.int32)
+		indices = numpy.concatenate(candidates)
+		distances = numpy.concatenate(candidate_distances)
+		order = numpy.lexsort((indices, distances))[:k]
+		return indices[order], distances[order]
+
+
+def _as_hash_array(hashes):
+	# type: (Iterable[ImageHash] | Iterable[str] | HashArray) -> HashArray
+	"""
+	internal function returning @hashes (ImageHash objects, a HashArray, or stored
+	hashes as hex strings as in hex_to_hash) as HashArray.
+	"""
+	if isinstance(hashes, HashArray):
+		return hashes
+	hashes = list(hashes)
+	if hashes and isinstance(hashes[0], str):
+		return HashArray.from_hex(hashes)
+	return HashArray(hashes)
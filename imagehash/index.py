@@ -0,0 +1,525 @@
+"""
+Search indices over many hashes
+
+These indices answer Hamming distance queries ("which hashes are within
+distance r of this one?") without comparing the query to every stored hash.
+
+Example:
+
+>>> from PIL import Image
+>>> import imagehash
+>>> images = [Image.open('tests/data/imagehash.png'), Image.open('tests/data/peppers.png')]
+>>> tree = imagehash.BKTree([imagehash.dhash(image) for image in images])
+>>> tree.search(imagehash.dhash(images[1].rotate(1)), 6)
+(array([1]), array([2], dtype=int32))
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from typing import TYPE_CHECKING
+
+import numpy
+
+from imagehash import _bitwise_count, _popcount
+from imagehash.hasharray import BLOCK_SIZE, HashArray, _as_hash_array
+
+if TYPE_CHECKING:
+	from typing import Callable, Iterable  # noqa: F401
+
+	from imagehash import ImageHash, ImageMultiHash  # noqa: F401
+
+
+def _pair_distances(words, a, b):
+	# type: (numpy.ndarray, numpy.ndarray, numpy.ndarray) -> numpy.ndarray
+	"""
+	internal function returning the Hamming distances between rows @a and rows @b of @words.
+	"""
+	return _bitwise_count(words[a] ^ words[b]).sum(axis=1, dtype=numpy.int32)
+
+
+def _grow(array, length):
+	# type: (numpy.ndarray, int) -> numpy.ndarray
+	"""
+	internal function returning @array extended with -1 entries to at least @length,
+	growing geometrically.
+	"""
+	if length <= len(array):
+		return array
+	grown = numpy.full(max(length, 2 * len(array), 16), -1, dtype=array.dtype)
+	grown[:len(array)] = array
+	return grown
+
+
+class BKTree:
+	"""
+	Burkhard-Keller tree over hashes, for radius and nearest neighbour queries
+	with the Hamming distance of ImageHash.__sub__.
+
+	Every node is a hash; the children of a node are keyed by their distance
+	to it, and the triangle inequality allows skipping whole subtrees.
+	Instead of nested python objects, the tree lives in flat arrays: the hashes
+	in a HashArray (node i is the i-th inserted hash), plus for each node its
+	distance to the parent, its first child and its next sibling.
+	Queries walk the tree level by level, with numpy operations over all nodes of a level.
+	"""
+
+	def __init__(self, hashes=()):
+		# type: (Iterable[ImageHash]) -> None
+		self.hashes = HashArray()
+		self._edge = numpy.zeros(0, dtype=numpy.int32)
+		self._first_child = numpy.zeros(0, dtype=numpy.int32)
+		self._next_sibling = numpy.zeros(0, dtype=numpy.int32)
+		self.extend(hashes)
+
+	def __len__(self):
+		return len(self.hashes)
+
+	def _reserve(self, length):
+		# type: (int) -> None
+		self._edge = _grow(self._edge, length)
+		self._first_child = _grow(self._first_child, length)
+		self._next_sibling = _grow(self._next_sibling, length)
+
+	def add(self, image_hash):
+		# type: (ImageHash) -> None
+		"""
+		Inserts a single hash.
+		"""
+		node = len(self.hashes)
+		self.hashes.append(image_hash)
+		self._reserve(node + 1)
+		if node == 0:
+			return
+		value = image_hash._value
+		parent = 0
+		while True:
+			distance = _popcount(value ^ self.hashes[parent]._value)
+			child = self._first_child[parent]
+			while child >= 0 and self._edge[child] != distance:
+				child = self._next_sibling[child]
+			if child < 0:
+				break
+			parent = child
+		self._edge[node] = distance
+		self._next_sibling[node] = self._first_child[parent]
+		self._first_child[parent] = node
+
+	def extend(self, hashes):
+		# type: (Iterable[ImageHash]) -> None
+		"""
+		Inserts many hashes. Into an empty tree, they are inserted in bulk,
+		level by level, which gives the same tree as adding them one by one
+		(up to the order of siblings).
+		"""
+		if len(self.hashes):
+			for image_hash in hashes:
+				self.add(image_hash)
+			return
+		self.hashes.extend(hashes)
+		self._reserve(len(self.hashes))
+		words = self.hashes._words()
+		# hashes still to be placed, and the node they have reached so far
+		members = numpy.arange(1, len(self.hashes), dtype=numpy.int32)
+		parents = numpy.zeros(len(members), dtype=numpy.int32)
+		while len(members):
+			distances = _pair_distances(words, members, parents)
+			# group by (parent, distance); the first hash of each group becomes the child
+			# node for that distance, and the others descend into it
+			order = numpy.lexsort((members, distances, parents))
+			members, parents, distances = members[order], parents[order], distances[order]
+			is_head = numpy.ones(len(members), dtype=bool)
+			is_head[1:] = (parents[1:] != parents[:-1]) | (distances[1:] != distances[:-1])
+			heads = members[is_head]
+			head_parents = parents[is_head]
+			self._edge[heads] = distances[is_head]
+			# chain the new children of each parent, ordered by distance
+			first = numpy.ones(len(heads), dtype=bool)
+			first[1:] = head_parents[1:] != head_parents[:-1]
+			self._first_child[head_parents[first]] = heads[first]
+			same_parent = ~first[1:]
+			self._next_sibling[heads[:-1][same_parent]] = heads[1:][same_parent]
+			group_head = heads[numpy.cumsum(is_head) - 1]
+			members, parents = members[~is_head], group_head[~is_head]
+
+	def _walk(self, query, radius_func):
+		# type: (ImageHash, Callable[[numpy.ndarray, numpy.ndarray], int]) -> tuple[numpy.ndarray, numpy.ndarray]
+		"""
+		internal function visiting the tree level by level. For each level,
+		@radius_func is called with the nodes and their distances to the query, and
+		returns the search radius for descending further. Returns all visited nodes
+		and their distances.
+		"""
+		if not len(self.hashes):
+			return numpy.zeros(0, dtype=numpy.int32), numpy.zeros(0, dtype=numpy.int32)
+		query_words = self.hashes._query_words(query)
+		words = self.hashes._words()
+		visited = []
+		visited_distances = []
+		frontier = numpy.zeros(1, dtype=numpy.int32)
+		while len(frontier):
+			distances = _bitwise_count(words[frontier] ^ query_words).sum(axis=1, dtype=numpy.int32)
+			visited.append(frontier)
+			visited_distances.append(distances)
+			radius = radius_func(frontier, distances)
+			# children whose distance to their parent is within radius of the query's
+			children = []
+			child = self._first_child[frontier]
+			parent_distances = distances
+			while len(child):
+				has_child = child >= 0
+				child, parent_distances = child[has_child], parent_distances[has_child]
+				children.append(child[numpy.abs(self._edge[child] - parent_distances) <= radius])
+				child = self._next_sibling[child]
+			frontier = numpy.concatenate(children)
+		return numpy.concatenate(visited), numpy.concatenate(visited_distances)
+
+	def search(self, query, radius):
+		# type: (ImageHash, int) -> tuple[numpy.ndarray, numpy.ndarray]
+		"""
+		Returns the indices and distances of all hashes at most @radius bits away
+		from @query, ordered by distance (and by index for equal distances).
+		"""
+		nodes, distances = self._walk(query, lambda nodes, distances: radius)
+		found = distances <= radius
+		nodes, distances = nodes[found], distances[found]
+		order = numpy.lexsort((nodes, distances))
+		return nodes[order].astype(numpy.intp), distances[order]
+
+	def nearest(self, query):
+		# type: (ImageHash) -> tuple[int, int]
+		"""
+		Returns the index and distance of the hash nearest to @query
+		(the lowest index among equally near ones).
+		"""
+		if not len(self.hashes):
+			raise ValueError('The tree is empty.')
+		best = [self.hashes.nbits]
+
+		def radius_func(nodes, distances):
+			best[0] = min(best[0], int(distances.min()))
+			return best[0]
+
+		nodes, distances = self._walk(query, radius_func)
+		nearest = numpy.lexsort((nodes, distances))[0]
+		return int(nodes[nearest]), int(distances[nearest])
+
+
+# flip masks of substring neighbourhoods, keyed by (substring bits, radius)
+_FLIP_MASKS = {}  # type: dict[tuple[int, int], numpy.ndarray]
+
+
+def _flip_masks(nbits, radius):
+	# type: (int, int) -> numpy.ndarray
+	"""
+	internal function returning all @nbits bit integers with at most @radius bits set,
+	i.e. the XOR masks leading from a key to all keys within Hamming distance @radius.
+	"""
+	masks = _FLIP_MASKS.get((nbits, radius))
+	if masks is None:
+		masks = numpy.zeros(1, dtype=numpy.int64)
+		for _ in range(min(radius, nbits)):
+			# set one more bit above the highest set bit of each mask
+			highest = numpy.zeros(len(masks), dtype=numpy.int64)
+			nonzero = masks > 0
+			highest[nonzero] = numpy.floor(numpy.log2(masks[nonzero])).astype(numpy.int64) + 1
+			new = [masks[highest <= bit] | (1 << bit) for bit in range(nbits)]
+			masks = numpy.unique(numpy.concatenate([masks] + new))
+		_FLIP_MASKS[(nbits, radius)] = masks
+	return masks
+
+
+def _gather_ranges(values, starts, stops):
+	# type: (numpy.ndarray, numpy.ndarray, numpy.ndarray) -> numpy.ndarray
+	"""
+	internal function concatenating values[starts[i]:stops[i]] for all i.
+	"""
+	lengths = stops - starts
+	total = int(lengths.sum())
+	if not total:
+		return values[:0]
+	offsets = numpy.repeat(starts - numpy.cumsum(lengths) + lengths, lengths)
+	return values[offsets + numpy.arange(total)]
+
+
+def _substring_bounds(nbits, length, substrings=None):
+	# type: (int, int, int | None) -> numpy.ndarray
+	"""
+	internal function returning the bit boundaries of the substrings of a MultiIndexHash
+	of @length hashes of @nbits bits, split into @substrings substrings.
+	"""
+	if substrings is None:
+		substring_bits = min(32, max(8, int(round(numpy.log2(max(length, 2))))))
+		substrings = -(-nbits // substring_bits)
+	substrings = max(1, min(substrings, nbits))
+	if nbits and -(-nbits // substrings) > 32:
+		raise ValueError('Substrings must not be longer than 32 bits; use more substrings.')
+	# the first substrings are one bit longer if needed
+	lengths = [nbits // substrings + (1 if j < nbits % substrings else 0) for j in range(substrings)]
+	return numpy.cumsum([0] + lengths)
+
+
+def _probe_masks(bounds, radius):
+	# type: (numpy.ndarray, int) -> list[numpy.ndarray | None]
+	"""
+	internal function returning for each substring (with bit boundaries @bounds) the flip
+	masks of its probes for a search with @radius, or None if its table is not probed.
+	"""
+	substrings = len(bounds) - 1
+	masks = []  # type: list[numpy.ndarray | None]
+	for j in range(substrings):
+		# generalised pigeonhole: the first radius % m substrings (plus one) use
+		# radius // m, the others one bit less
+		substring_radius = radius // substrings - (0 if j <= radius % substrings else 1)
+		if substring_radius < 0:
+			masks.append(None)
+		else:
+			masks.append(_flip_masks(bounds[j + 1] - bounds[j], substring_radius))
+	return masks
+
+
+def _search_work(nbits, length, radius):
+	# type: (int, int, int) -> float
+	"""
+	internal function returning the expected number of probes and candidates per search
+	with @radius in a MultiIndexHash of @length hashes of @nbits bits (with the default
+	substrings), if the substrings are uniformly distributed.
+	"""
+	bounds = _substring_bounds(nbits, length)
+	return sum(
+		len(masks) * (1 + length / 2**(bounds[j + 1] - bounds[j]))
+		for j, masks in enumerate(_probe_masks(bounds, radius)) if masks is not None)
+
+
+class MultiIndexHash:
+	"""
+	Multi-index hashing for exact Hamming radius queries over large collections.
+
+	Every hash is split into m substrings, and each substring position has a
+	table from substring to the hashes containing it. If two hashes are at most
+	r bits apart, then by the pigeonhole principle at least one of their
+	substrings is at most r // m bits apart. A query therefore probes, for each
+	table, all substrings within that small radius of its own, and verifies the
+	collected candidates with the full distance.
+
+	The tables are stored as sorted arrays of substrings with the row ids of
+	their hashes, and probed with numpy.searchsorted. Tables of short substrings
+	instead store the offsets of all possible substrings, and are probed directly.
+	After each search, the stats attribute holds the number of probes, of
+	candidates verified and of results, for tuning the number of substrings.
+	"""
+
+	def __init__(self, hashes, substrings=None):
+		# type: (Iterable[ImageHash] | Iterable[str] | HashArray, int | None) -> None
+		"""
+		@hashes ImageHash objects, a HashArray, or stored hashes (hex strings as in hex_to_hash).
+		@substrings number of substrings m. By default, substrings are about log2(N)
+		bits long, which balances the number of probes and of candidates.
+		"""
+		hashes = _as_hash_array(hashes)
+		self.hashes = hashes
+		self._bounds = _substring_bounds(hashes.nbits, len(hashes), substrings)
+		self.stats = {}  # type: dict[str, int]
+		self._build()
+
+	def __len__(self):
+		return len(self.hashes)
+
+	def _keys(self, rows):
+		# type: (numpy.ndarray) -> numpy.ndarray
+		"""
+		internal function returning the substrings of packed @rows, as (rows x m) int64 array.
+		"""
+		padding = rows.shape[1] * 8 - self.hashes.nbits
+		bits = numpy.unpackbits(rows, axis=1)[:, padding:].astype(numpy.int64)
+		keys = numpy.zeros((len(rows), len(self._bounds) - 1), dtype=numpy.int64)
+		for j, (start, stop) in enumerate(zip(self._bounds[:-1], self._bounds[1:])):
+			weights = numpy.left_shift(1, numpy.arange(stop - start - 1, -1, -1, dtype=numpy.int64))
+			keys[:, j] = bits[:, start:stop].dot(weights)
+		return keys
+
+	def _build(self):
+		# type: () -> None
+		data = self.hashes._data[:len(self.hashes)]
+		keys = numpy.zeros((len(data), len(self._bounds) - 1), dtype=numpy.int64)
+		for start in range(0, len(data), BLOCK_SIZE):
+			keys[start:start + BLOCK_SIZE] = self._keys(data[start:start + BLOCK_SIZE])
+		self._tables = []  # type: list[tuple[numpy.ndarray | None, numpy.ndarray, numpy.ndarray]]
+		for j, column in enumerate(keys.T):
+			rows = numpy.argsort(column, kind='stable').astype(numpy.int32)
+			nkeys = 1 << int(self._bounds[j + 1] - self._bounds[j])
+			if nkeys <= max(4 * len(rows), 1 << 16):
+				# short substrings: offsets of all possible keys, so probes need no binary search
+				offsets = numpy.zeros(nkeys + 1, dtype=numpy.int64)
+				numpy.cumsum(numpy.bincount(column, minlength=nkeys), out=offsets[1:])
+				self._tables.append((None, offsets, rows))
+				continue
+			unique, starts = numpy.unique(column[rows], return_index=True)
+			offsets = numpy.append(starts, len(rows))
+			self._tables.append((unique, offsets, rows))
+
+	def _masks(self, radius):
+		# type: (int) -> list[numpy.ndarray | None]
+		return _probe_masks(self._bounds, radius)
+
+	def _candidates(self, keys, radius):
+		# type: (numpy.ndarray, int) -> tuple[numpy.ndarray, numpy.ndarray, int]
+		"""
+		internal function returning the pairs (query, row id) of the queries with substrings
+		@keys (queries x m) and the rows sharing a substring within the pigeonhole radius,
+		without duplicates, and the number of probes made.
+		"""
+		queries = []
+		candidates = []
+		probes = 0
+		for j, masks in enumerate(self._masks(radius)):
+			if masks is None:
+				continue
+			unique, offsets, rows = self._tables[j]
+			probe = (keys[:, j, None] ^ masks).ravel()
+			probes += len(probe)
+			if unique is None:
+				starts, stops = offsets[probe], offsets[probe + 1]
+				hit = numpy.flatnonzero(stops > starts)
+				starts, stops = starts[hit], stops[hit]
+			else:
+				position = numpy.minimum(numpy.searchsorted(unique, probe), len(unique) - 1)
+				hit = numpy.flatnonzero(unique[position] == probe)
+				starts, stops = offsets[position[hit]], offsets[position[hit] + 1]
+			queries.append(numpy.repeat(hit // len(masks), stops - starts))
+			candidates.append(_gather_ranges(rows, starts, stops))
+		if not candidates:
+			return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.int32), probes
+		pairs = numpy.concatenate(queries) * len(self.hashes) + numpy.concatenate(candidates)
+		# sort and drop repeats; faster than numpy.unique, which hashes large int arrays
+		pairs.sort()
+		pairs = pairs[numpy.append(True, pairs[1:] != pairs[:-1])] if len(pairs) else pairs
+		return pairs // len(self.hashes), (pairs % len(self.hashes)).astype(numpy.int32), probes
+
+	def _search_rows(self, rows, radius):
+		# type: (numpy.ndarray, int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+		"""
+		internal function searching the hashes at most @radius bits away from each of
+		the packed @rows (of the same layout as the indexed hashes) at once.
+		Returns the arrays (row of the query, index, distance) of all results,
+		ordered by query and index. Sets stats for all queries together.
+		"""
+		if not len(self.hashes) or not len(rows):
+			self.stats = dict(probes=0, candidates=0, results=0)
+			return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.int32)
+		queries, candidates, probes = self._candidates(self._keys(rows), radius)
+		query_words = rows.view(numpy.uint64)
+		words = self.hashes._words()
+		distances = _bitwise_count(words[candidates] ^ query_words[queries]).sum(axis=1, dtype=numpy.int32)
+		found = distances <= radius
+		self.stats = dict(probes=probes, candidates=len(found), results=int(found.sum()))
+		return queries[found], candidates[found].astype(numpy.intp), distances[found]
+
+	def search(self, query, radius):
+		# type: (ImageHash, int) -> tuple[numpy.ndarray, numpy.ndarray]
+		"""
+		Returns the indices and distances of all hashes at most @radius bits away
+		from @query, ordered by distance (and by index for equal distances).
+		"""
+		query_words = self.hashes._query_words(query) if len(self.hashes) else numpy.zeros(0, dtype=numpy.uint64)
+		_, indices, distances = self._search_rows(query_words.view(numpy.uint8).reshape((1, -1)), radius)
+		order = numpy.argsort(distances, kind='stable')
+		return indices[order], distances[order]
+
+
+def _segment_array(multihashes):
+	# type: (list[ImageMultiHash]) -> tuple[HashArray, numpy.ndarray]
+	"""
+	internal function returning the segment hashes of all @multihashes in one HashArray,
+	and for each segment the index of the multi-hash owning it.
+	"""
+	segments = HashArray()
+	for multihash in multihashes:
+		segments.extend(multihash.segment_hashes)
+	counts = [len(multihash.segment_hashes) for multihash in multihashes]
+	return segments, numpy.repeat(numpy.arange(len(counts), dtype=numpy.int32), counts)
+
+
+class SegmentIndex:
+	"""
+	Index over the segment hashes of many ImageMultiHash objects (e.g. from
+	crop_resistant_hash), to find the best match of a multi-hash in a large corpus.
+
+	The segment hashes of all multi-hashes are kept in a MultiIndexHash, along
+	with the multi-hash owning each of them. A query searches the neighbours of
+	each of its segments, and every multi-hash gets one vote per query segment
+	it has a segment near to. Only the multi-hashes with most votes are then
+	compared with ImageMultiHash.__sub__.
+
+	A query segment counts as matching in ImageMultiHash.hash_diff exactly if it
+	gets a vote at the search radius hamming_cutoff, so with an unbounded
+	candidate budget, best_match gives the same result as ImageMultiHash.best_match.
+	"""
+
+	def __init__(self, multihashes, substrings=None):
+		# type: (list[ImageMultiHash], int | None) -> None
+		"""
+		@multihashes the corpus of multi-hashes; results refer to their position in this list.
+		@substrings number of substrings of the segment hash index, see MultiIndexHash.
+		"""
+		self.multihashes = list(multihashes)
+		segments, self.owners = _segment_array(self.multihashes)
+		self.segments = MultiIndexHash(segments, substrings)
+
+	def __len__(self):
+		return len(self.multihashes)
+
+	def votes(self, query, radius):
+		# type: (ImageMultiHash, int) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+		"""
+		Returns the multi-hashes with a segment at most @radius bits away from a segment of @query,
+		as arrays of their indices, votes (number of query segments near to one of their segments)
+		and summed distances (of each voting query segment to its nearest segment).
+		"""
+		owner_parts = []
+		distance_parts = []
+		for segment_hash in query.segment_hashes:
+			indices, segment_distances = self.segments.search(segment_hash, radius)
+			# results are ordered by distance, so the first of each owner is its nearest segment
+			segment_owners, first = numpy.unique(self.owners[indices], return_index=True)
+			owner_parts.append(segment_owners)
+			distance_parts.append(segment_distances[first])
+		owners = numpy.concatenate(owner_parts) if owner_parts else numpy.zeros(0, dtype=numpy.int32)
+		distances = numpy.concatenate(distance_parts) if distance_parts else numpy.zeros(0, dtype=numpy.int32)
+		votes = numpy.bincount(owners, minlength=len(self))
+		sums = numpy.bincount(owners, weights=distances, minlength=len(self)).astype(numpy.int64)
+		voted = numpy.flatnonzero(votes)
+		return voted, votes[voted], sums[voted]
+
+	def best_match(self, query, hamming_cutoff=None, bit_error_rate=None, max_candidates=None, search_radius=None):
+		# type: (ImageMultiHash, float | None, float | None, int | None, int | None) -> int
+		"""
+		Returns the index of the multi-hash in the corpus which is the best match to @query,
+		as ImageMultiHash.best_match.
+		:param hamming_cutoff: The maximum hamming distance to a region hash in the target hash
+		:param bit_error_rate: Percentage of bits which can be incorrect, an alternative to the hamming cutoff.
+		Defaults to 0.25 if unset, which means the hash can be 25% different
+		:param max_candidates: If set, only this many multi-hashes with the most votes are compared to @query.
+		:param search_radius: Radius of the segment search, if smaller than the hamming cutoff. This is
+		faster, but multi-hashes whose segments all lie in between are no longer considered.
+		"""
+		if not self.multihashes:
+			raise ValueError('best_match of an empty SegmentIndex')
+		if hamming_cutoff is None:
+			if bit_error_rate is None:
+				bit_error_rate = 0.25
+			# a query without segments matches nothing, whatever the cutoff
+			hamming_cutoff = len(query.segment_hashes[0]) * bit_error_rate if query.segment_hashes else 0
+		radius = int(numpy.floor(hamming_cutoff))
+		if search_radius is not None:
+			radius = min(radius, search_radius)
+		candidates, votes, sums = self.votes(query, radius)
+		unvoted = numpy.ones(len(self), dtype=bool)
+		unvoted[candidates] = False
+		# most votes first, then the nearest, then the first in the corpus
+		candidates = candidates[numpy.lexsort((candidates, sums, -votes))][:max_candidates]
+		scores = [query.__sub__(self.multihashes[i], hamming_cutoff, bit_error_rate) for i in candidates]
+		# multi-hashes without votes have no matching segments, which scores the number of query segments
+		if unvoted.any():
+			candidates = numpy.append(candidates, unvoted.argmax())
+			scores.append(len(query.segment_hashes))
+		return int(candidates[numpy.lexsort((candidates, numpy.array(scores)))[0]])
@@ -0,0 +1,416 @@
+"""
+Near neighbours within collections of hashes
+
+These functions find all pairs of hashes within a Hamming distance of each
+other, without a python loop over ImageHash.__sub__: either by comparing blocks
+of packed hashes with vectorized XOR and popcount, or, for large collections
+and small distances, with a MultiIndexHash. pairwise_distances computes the
+distances of all pairs the same way, block by block.
+
+Example:
+
+>>> from PIL import Image
+>>> import imagehash, imagehash.neighbors
+>>> images = [Image.open('tests/data/imagehash.png'), Image.open('tests/data/peppers.png')]
+>>> images.append(images[1].rotate(1))
+>>> imagehash.neighbors.cluster_hashes([imagehash.dhash(image) for image in images], 6)
+array([0, 1, 1])
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+from concurrent import futures
+from typing import TYPE_CHECKING
+
+import numpy
+
+import imagehash.index
+from imagehash import ImageMultiHash, _bitwise_count, _union_edges
+from imagehash.hasharray import BLOCK_SIZE, HashArray, _as_hash_array
+from imagehash.index import MultiIndexHash, SegmentIndex
+
+if TYPE_CHECKING:
+	from typing import Any, Iterable, Iterator  # noqa: F401
+
+	from imagehash import ImageHash  # noqa: F401
+
+# number of 64 bit words XORed at once when comparing two blocks of hashes
+TILE_WORDS = 1 << 20
+
+
+def _tile_distances(a, b):
+	# type: (numpy.ndarray, numpy.ndarray) -> numpy.ndarray
+	"""
+	internal function returning the len(@a) x len(@b) Hamming distances between
+	the rows of the packed words @a and @b, as uint8 (for one word) or uint16 array.
+	"""
+	# word by word, which keeps the temporaries 2D and is several times faster than
+	# summing over a 3D array of XORed words
+	distances = _bitwise_count(a[:, 0, None] ^ b[:, 0])
+	if a.shape[1] > 1:
+		distances = distances.astype(numpy.uint16)
+		for k in range(1, a.shape[1]):
+			distances += _bitwise_count(a[:, k, None] ^ b[:, k])
+	return distances
+
+
+def _tile_size(words):
+	# type: (int) -> int
+	"""
+	internal function returning the number of rows per tile, so that comparing two tiles
+	of hashes with @words 64 bit words each XORs at most TILE_WORDS words.
+	"""
+	return max(16, int(numpy.sqrt(TILE_WORDS // max(words, 1))))
+
+
+def _blocks(length, block, owners=None):
+	# type: (int, int, numpy.ndarray | None) -> Iterator[tuple[int, int]]
+	"""
+	internal generator of (start, stop) ranges of about @block of @length rows, which
+	do not split the segments of a multi-hash (consecutive rows with equal @owners).
+	"""
+	start = 0
+	while start < length:
+		stop = min(start + block, length)
+		if owners is not None and stop < length:
+			stop = int(numpy.searchsorted(owners, owners[stop - 1], side='right'))
+		yield start, stop
+		start = stop
+
+
+def _blocked_join(queries, hashes, radius, owners=None, self_join=False):
+	# type: (HashArray, HashArray, int, numpy.ndarray | None, bool) -> Iterator[tuple[numpy.ndarray, ...]]
+	"""
+	internal generator comparing blocks of @queries with all @hashes, tile by tile, and
+	yielding (query, index, distance) arrays per block. With @self_join, @hashes are the
+	@queries and only pairs with query < index are compared.
+	"""
+	query_words = queries._words()
+	words = hashes._words()
+	tile = _tile_size(words.shape[1])
+	for start, stop in _blocks(len(query_words), tile, owners):
+		chunks = []
+		for other_start in range(start if self_join else 0, len(words), tile):
+			distances = _tile_distances(query_words[start:stop], words[other_start:other_start + tile])
+			found = numpy.flatnonzero(distances <= radius)
+			i, j = numpy.divmod(found, distances.shape[1])
+			i, j = i + start, j + other_start
+			if self_join:
+				upper = i < j
+				found, i, j = found[upper], i[upper], j[upper]
+			chunks.append((i, j, distances.ravel()[found].astype(numpy.int32)))
+		yield tuple(numpy.concatenate(arrays) for arrays in zip(*chunks))
+
+
+def _probes(index, radius):
+	# type: (MultiIndexHash, int) -> int
+	"""
+	internal function returning the number of probes of @index per query with @radius.
+	"""
+	return sum(len(masks) for masks in index._masks(radius) if masks is not None)
+
+
+def _indexed_join(queries, index, radius, owners=None, self_join=False):
+	# type: (HashArray, MultiIndexHash, int, numpy.ndarray | None, bool) -> Iterator[tuple[numpy.ndarray, ...]]
+	"""
+	internal generator searching the neighbours of blocks of @queries in @index, as _blocked_join.
+	"""
+	block = max(1, BLOCK_SIZE // max(1, _probes(index, radius)))
+	data = queries._data[:len(queries)]
+	for start, stop in _blocks(len(data), block, owners):
+		i, j, distances = index._search_rows(data[start:stop], radius)
+		i = i + start
+		if self_join:
+			upper = i < j
+			i, j, distances = i[upper], j[upper], distances[upper]
+		yield i, j, distances
+
+
+def _use_index(hashes, radius, queries, pairs):
+	# type: (HashArray, int, int, float) -> bool
+	"""
+	internal function estimating whether building a MultiIndexHash of @hashes and
+	searching it for @queries hashes is faster than comparing @pairs pairs of hashes.
+	"""
+	work = imagehash.index._search_work(hashes.nbits, len(hashes), radius)
+	# verifying a candidate costs about as much as comparing 32 pairs of words in tiles,
+	# and indexing a hash about as much as 400
+	return 32 * work * queries + 400 * len(hashes) < pairs * (hashes._width // 8)
+
+
+def _check_method(method):
+	# type: (str | None) -> None
+	if method not in (None, 'blocked', 'index'):
+		raise ValueError('Unknown method {!r}, expected "blocked" or "index".'.format(method))
+
+
+def radius_pairs(hashes, radius, method=None):
+	# type: (Iterable[ImageHash] | Iterable[str] | HashArray, int, str | None) -> Iterator[tuple[numpy.ndarray, ...]]
+	"""
+	Yields all pairs of hashes at most @radius bits apart, in chunks of arrays (i, j, distances)
+	with i < j, where i and j are the positions in @hashes.
+	Only one chunk is held in memory at a time, so that this scales to millions of hashes.
+
+	@hashes ImageHash objects, a HashArray, or stored hashes (hex strings as in hex_to_hash).
+	@method 'blocked' compares all pairs, in tiles of packed hashes.
+	'index' searches the neighbours of each hash in a MultiIndexHash, which is much faster
+	for large collections and small radii. By default, the faster one is estimated.
+	"""
+	_check_method(method)
+	hashes = _as_hash_array(hashes)
+	if not len(hashes):
+		return
+	if method is None:
+		method = 'index' if _use_index(hashes, radius, len(hashes), len(hashes)**2 / 2) else 'blocked'
+	if method == 'index':
+		yield from _indexed_join(hashes, MultiIndexHash(hashes), radius, self_join=True)
+	else:
+		yield from _blocked_join(hashes, hashes, radius, self_join=True)
+
+
+def _join_side(hashes):
+	# type: (Any) -> tuple[HashArray, numpy.ndarray | None, MultiIndexHash | None]
+	"""
+	internal function returning the hashes of one side of join_hashes, the multi-hash
+	owning each of them (or None if they are not segment hashes), and their index if given.
+	"""
+	if isinstance(hashes, MultiIndexHash):
+		return hashes.hashes, None, hashes
+	if isinstance(hashes, SegmentIndex):
+		return hashes.segments.hashes, hashes.owners, hashes.segments
+	if not isinstance(hashes, HashArray):
+		hashes = list(hashes)
+		if hashes and isinstance(hashes[0], ImageMultiHash):
+			segments, owners = imagehash.index._segment_array(hashes)
+			return segments, owners, None
+	return _as_hash_array(hashes), None, None
+
+
+def _nearest_segments(i, j, distances, owners_a, owners_b):
+	# type: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray | None, numpy.ndarray | None) -> tuple[numpy.ndarray, ...]
+	"""
+	internal function turning pairs of segments into pairs of their multi-hashes,
+	keeping the smallest distance of each pair of multi-hashes.
+	"""
+	if owners_a is not None:
+		i = owners_a[i].astype(numpy.intp)
+	if owners_b is not None:
+		j = owners_b[j].astype(numpy.intp)
+	order = numpy.lexsort((distances, j, i))
+	i, j, distances = i[order], j[order], distances[order]
+	first = numpy.ones(len(i), dtype=bool)
+	first[1:] = (i[1:] != i[:-1]) | (j[1:] != j[:-1])
+	return i[first], j[first], distances[first]
+
+
+def join_hashes(a, b, radius, method=None):
+	# type: (Any, Any, int, str | None) -> Iterator[tuple[numpy.ndarray, ...]]
+	"""
+	Yields all pairs of a hash in @a and a hash in @b at most @radius bits apart, in chunks
+	of arrays (i, j, distances), where i is the position in @a and j the position in @b.
+	Only one chunk is held in memory at a time.
+
+	@a, @b ImageHash objects, HashArrays, hex strings (as in hex_to_hash) or a MultiIndexHash,
+	which is then searched instead of building an index.
+	They may also be ImageMultiHash objects (or a SegmentIndex), whose segment hashes are
+	compared: a pair of multi-hashes is then reported once, with the smallest distance of
+	any of their segments.
+	@method 'blocked' compares all pairs, in tiles of packed hashes. 'index' builds a
+	MultiIndexHash of the larger side, and searches it for blocks of hashes of the smaller
+	side. By default, the faster one is estimated.
+	"""
+	_check_method(method)
+	a, owners_a, index_a = _join_side(a)
+	b, owners_b, index_b = _join_side(b)
+	if not len(a) or not len(b):
+		return
+	if a.nbits != b.nbits:
+		raise TypeError('ImageHashes must be of the same shape.', a.hash_shape, b.hash_shape)
+	# search the given index, or else that of the larger side
+	swap = index_b is None and (index_a is not None or len(a) > len(b))
+	queries, query_owners, hashes, index = (b, owners_b, a, index_a) if swap else (a, owners_a, b, index_b)
+	if method is None and index is None:
+		method = 'index' if _use_index(hashes, radius, len(queries), len(queries) * len(hashes)) else 'blocked'
+	if method == 'blocked':
+		chunks = _blocked_join(queries, hashes, radius, query_owners)
+	else:
+		chunks = _indexed_join(queries, index or MultiIndexHash(hashes), radius, query_owners)
+	for i, j, distances in chunks:
+		if swap:
+			i, j = j, i
+		if owners_a is not None or owners_b is not None:
+			i, j, distances = _nearest_segments(i, j, distances, owners_a, owners_b)
+		yield i, j, distances
+
+
+def cluster_hashes(hashes, threshold, method=None):
+	# type: (Iterable[ImageHash] | Iterable[str] | HashArray, int, str | None) -> numpy.ndarray
+	"""
+	Groups near-duplicate hashes: two hashes are in the same cluster if they are
+	at most @threshold bits apart, or are connected by a chain of such hashes.
+
+	Returns an array with the cluster of each hash in @hashes, identified by the
+	position of its first hash. The clusters are the connected components of the
+	pairs found by radius_pairs (see there for @method), merged with union-find.
+	"""
+	hashes = _as_hash_array(hashes)
+	labels = numpy.arange(len(hashes))
+	# merging costs a few passes over all labels, so edges are collected into large batches first
+	batch = []  # type: list[tuple[numpy.ndarray, numpy.ndarray]]
+	batch_size = 0
+	for i, j, _ in radius_pairs(hashes, threshold, method):
+		batch.append((i, j))
+		batch_size += len(i)
+		if batch_size >= max(BLOCK_SIZE, len(labels)):
+			labels = _union_edges(labels, *map(numpy.concatenate, zip(*batch)))
+			batch, batch_size = [], 0
+	if batch:
+		labels = _union_edges(labels, *map(numpy.concatenate, zip(*batch)))
+	return labels
+
+
+# number of blocks of columns compared with a block of rows before writing them out
+STRIP_BLOCKS = 16
+
+
+def _block_rows(words, itemsize, block_size=None, max_memory=None, workers=1):
+	# type: (int, int, int | None, int | None, int) -> int
+	"""
+	internal function returning the number of hashes per block of pairwise_distances.
+	"""
+	block = block_size or _tile_size(words)
+	if max_memory is not None:
+		# per thread, the temporaries of a tile take about 12 bytes per pair,
+		# and the strip of distances STRIP_BLOCKS tiles
+		per_pair = 12 + STRIP_BLOCKS * itemsize
+		block = min(block, int(numpy.sqrt(max_memory / workers / per_pair)))
+	return max(1, block)
+
+
+def _distance_strip(words, rows, columns, block, dtype):
+	# type: (numpy.ndarray, slice, slice, int, type) -> numpy.ndarray
+	"""
+	internal function returning the distances between the hashes @rows and @columns
+	of the packed @words, computed in tiles of @block columns.
+	"""
+	strip = numpy.empty((rows.stop - rows.start, columns.stop - columns.start), dtype=dtype)
+	for start in range(columns.start, columns.stop, block):
+		stop = min(start + block, columns.stop)
+		strip[:, start - columns.start:stop - columns.start] = _tile_distances(words[rows], words[start:stop])
+	return strip
+
+
+def _condensed_offset(i, length):
+	# type: (int, int) -> int
+	"""
+	internal function returning the position of the pair (i, i + 1) in a condensed distance matrix.
+	"""
+	return i * (2 * length - i - 1) // 2
+
+
+def _write_strip(out, form, strip, rows, columns, threshold, length):
+	# type: (numpy.ndarray | None, str, numpy.ndarray, slice, slice, int | None, int) -> tuple[numpy.ndarray, ...] | None
+	"""
+	internal function storing the distances @strip of the hashes @rows and @columns
+	(with columns.start >= rows.start) of @length hashes in @out, or returning the
+	pairs within @threshold for the sparse form.
+	"""
+	if form == 'sparse':
+		found = numpy.flatnonzero(strip <= threshold)
+		i, j = numpy.divmod(found, strip.shape[1])
+		i, j = i + rows.start, j + columns.start
+		upper = i < j
+		return i[upper], j[upper], strip.ravel()[found[upper]].astype(numpy.int32)
+	assert out is not None
+	if form == 'square':
+		out[rows, columns] = strip
+		# mirror tile by tile, so that the transposed reads stay in the cache
+		block = rows.stop - rows.start
+		for start in range(columns.start, columns.stop, block):
+			stop = min(start + block, columns.stop)
+			out[start:stop, rows] = strip[:, start - columns.start:stop - columns.start].T
+	else:
+		for row in range(rows.start, rows.stop):
+			first = max(columns.start, row + 1)
+			if first < columns.stop:
+				offset = _condensed_offset(row, length) - row - 1
+				out[offset + first:offset + columns.stop] = strip[row - rows.start, first - columns.start:]
+	return None
+
+
+def _distance_output(out, form, length, dtype):
+	# type: (numpy.ndarray | str | None, str, int, type) -> numpy.ndarray | None
+	"""
+	internal function returning the array to write the distances of @length hashes in @form to:
+	@out if given as array, a new .npy file mapped into memory if given as path, or a new array.
+	"""
+	shape = (length, length) if form == 'square' else (length * (length - 1) // 2,)
+	if form == 'sparse':
+		if out is not None:
+			raise ValueError('The sparse form is returned as arrays, and cannot be written to out.')
+		return None
+	if out is None:
+		return numpy.empty(shape, dtype=dtype)
+	if isinstance(out, str):
+		return numpy.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+	if out.shape != shape or not numpy.can_cast(dtype, out.dtype):
+		emsg = 'Expected out of shape {} and dtype {} (or larger), got {} {}.'
+		raise ValueError(emsg.format(shape, numpy.dtype(dtype), out.shape, out.dtype))
+	return out
+
+
+def pairwise_distances(hashes, form='square', threshold=None, out=None, block_size=None, max_memory=None, workers=None):
+	# type: (Iterable[ImageHash] | HashArray, str, int | None, Any, int | None, int | None, int | None) -> Any
+	"""
+	Returns the Hamming distances between all pairs of @hashes, as ImageHash.__sub__.
+	The distances are uint8, or uint16 for hashes of more than 255 bits.
+
+	@hashes ImageHash objects, a HashArray, or stored hashes (hex strings as in hex_to_hash).
+	@form 'square' gives the N x N matrix. 'condensed' gives the distances of the
+	pairs i < j, ordered by i and j, as scipy.spatial.distance.pdist (which
+	scipy.spatial.distance.squareform turns into the matrix). 'sparse' gives the pairs at most
+	@threshold bits apart as arrays (i, j, distances) with i < j, as radius_pairs;
+	@threshold is only accepted for this form.
+	@out array of the shape and dtype of the result to write it to, e.g. a numpy.memmap,
+	or the path of a .npy file to create for it (which numpy.load(path, mmap_mode='r') opens).
+	@block_size number of hashes per block. Each block is compared with the hashes after it,
+	in tiles of @block_size squared pairs. By default, the tiles fit into the CPU caches.
+	@max_memory bound of the temporary memory of all threads in bytes, which reduces the
+	block size if needed. The result itself is not included.
+	@workers number of threads comparing blocks in parallel, by default one per CPU.
+	"""
+	if form not in ('square', 'condensed', 'sparse'):
+		raise ValueError('Unknown form {!r}, expected "square", "condensed" or "sparse".'.format(form))
+	if form == 'sparse' and threshold is None:
+		raise ValueError('The sparse form needs a threshold.')
+	if form != 'sparse' and threshold is not None:
+		raise ValueError('A threshold only applies to the sparse form, not the {} form.'.format(form))
+	hashes = _as_hash_array(hashes)
+	dtype = numpy.uint8 if hashes.nbits < 256 else numpy.uint16
+	out = _distance_output(out, form, len(hashes), dtype)
+	if not len(hashes):
+		return out if out is not None else (numpy.zeros(0, dtype=numpy.intp),) * 2 + (numpy.zeros(0, dtype=numpy.int32),)
+	words = hashes._words()
+	workers = workers or os.cpu_count() or 1
+	block = _block_rows(words.shape[1], numpy.dtype(dtype).itemsize, block_size, max_memory, workers)
+
+	def compare_block(start):
+		rows = slice(start, min(start + block, len(words)))
+		pairs = []
+		for column in range(start, len(words), block * STRIP_BLOCKS):
+			columns = slice(column, min(column + block * STRIP_BLOCKS, len(words)))
+			strip = _distance_strip(words, rows, columns, block, dtype)
+			pairs.append(_write_strip(out, form, strip, rows, columns, threshold, len(words)))
+		return pairs
+
+	starts = range(0, len(words), block)
+	if workers > 1 and len(starts) > 1:
+		# the XOR and popcount of tiles release the GIL, so threads compare blocks in parallel
+		with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+			results = list(executor.map(compare_block, starts))
+	else:
+		results = [compare_block(start) for start in starts]
+	if form != 'sparse':
+		return out
+	return tuple(numpy.concatenate(arrays) for arrays in zip(*[pairs for block_pairs in results for pairs in block_pairs]))
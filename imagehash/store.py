@@ -0,0 +1,236 @@
+"""
+Binary on-disk storage of many hashes
+
+A hash store file holds a small header (hash algorithm, hash shape, format
+version, number of hashes) followed by the packed hashes, one row per hash in
+the layout of HashArray, optionally each followed by an integer id (e.g. a
+database key or a file offset). Opening a store maps the file into memory with
+numpy.memmap, so there is nothing to parse and several processes opening the
+same file share its pages.
+
+Example:
+
+>>> from PIL import Image
+>>> import imagehash, imagehash.store
+>>> images = [Image.open('tests/data/imagehash.png'), Image.open('tests/data/peppers.png')]
+>>> with imagehash.store.HashStoreWriter('hashes.bin', (8, 8), algorithm='phash', ids=True) as writer:
+...     for i, image in enumerate(images):
+...         writer.append(imagehash.phash(image), id=1000 + i)
+>>> store = imagehash.store.open_store('hashes.bin')
+>>> store.hashes.within(imagehash.phash(images[1]), 10)
+array([1])
+>>> int(store.ids[1]), store[1] == imagehash.phash(images[1])
+(1001, True)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import struct
+from typing import TYPE_CHECKING
+
+import numpy
+
+from imagehash.hasharray import HashArray
+
+if TYPE_CHECKING:
+	from typing import BinaryIO, Iterable  # noqa: F401
+
+	from imagehash import ImageHash  # noqa: F401
+
+MAGIC = b'IMGHASH\0'
+VERSION = 1
+# magic, format version, metadata length, number of hashes
+_PREFIX = struct.Struct('<8sIIQ')
+# the hashes start at a multiple of this offset, so that they can be read as 64 bit words
+_ALIGNMENT = 64
+
+
+def _record_dtype(width, ids):
+	# type: (int, bool) -> numpy.dtype
+	if ids:
+		return numpy.dtype([('hash', numpy.uint8, (width,)), ('id', '<i8')])
+	return numpy.dtype((numpy.uint8, (width,)))
+
+
+def _read_header(f):
+	# type: (BinaryIO) -> tuple[dict, int, int]
+	"""
+	internal function returning the metadata, number of hashes and data offset of the store in @f.
+	"""
+	prefix = f.read(_PREFIX.size)
+	if len(prefix) < _PREFIX.size or prefix[:len(MAGIC)] != MAGIC:
+		raise ValueError('Not a hash store file.')
+	_, version, metadata_length, count = _PREFIX.unpack(prefix)
+	if version > VERSION:
+		raise ValueError('Hash store format version {} is newer than supported ({}).'.format(version, VERSION))
+	metadata = json.loads(f.read(metadata_length).decode('utf-8'))
+	offset = -(-(_PREFIX.size + metadata_length) // _ALIGNMENT) * _ALIGNMENT
+	return metadata, count, offset
+
+
+class HashStore:
+	"""
+	Hashes of a store file, as returned by open_store.
+
+	hashes is a HashArray backed by the memory map, so it can be searched
+	directly or passed to BKTree and MultiIndexHash. ids is the id column
+	(a memory mapped int64 array), or None if the store has no ids.
+	"""
+
+	def __init__(self, path):
+		# type: (str) -> None
+		with open(path, 'rb') as f:
+			self.metadata, count, offset = _read_header(f)
+		self.path = path
+		self.algorithm = self.metadata.get('algorithm')  # type: str | None
+		hash_shape = tuple(self.metadata['hash_shape'])
+		empty = HashArray(hash_shape=hash_shape)
+		dtype = _record_dtype(empty._width, self.metadata['ids'])
+		if count:
+			records = numpy.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))  # type: numpy.ndarray
+		else:
+			records = numpy.zeros(0, dtype=dtype)
+		if self.metadata['ids']:
+			self.hashes = HashArray.from_packed(records['hash'], hash_shape)
+			self.ids = records['id']  # type: numpy.ndarray | None
+		else:
+			self.hashes = HashArray.from_packed(records, hash_shape)
+			self.ids = None
+
+	@property
+	def hash_shape(self):
+		# type: () -> tuple[int, ...]
+		return tuple(self.metadata['hash_shape'])
+
+	def __len__(self):
+		return len(self.hashes)
+
+	def __getitem__(self, index):
+		# type: (int) -> ImageHash
+		return self.hashes[index]
+
+	def __repr__(self):
+		return 'HashStore({!r}, <{} {} hashes of shape {}>)'.format(
+			self.path, len(self), self.algorithm, self.hash_shape)
+
+
+def open_store(path):
+	# type: (str) -> HashStore
+	"""
+	Opens a hash store file written by HashStoreWriter or write_store, without
+	reading the hashes into memory.
+	"""
+	return HashStore(path)
+
+
+class HashStoreWriter:
+	"""
+	Writes hashes to a store file incrementally.
+
+	The number of hashes in the header is updated by flush() and close(), so
+	that readers opening the file in the meantime see only complete records.
+	Use as a context manager, or call close() when done.
+	"""
+
+	def __init__(self, path, hash_shape=None, algorithm=None, ids=False, metadata=None, append=False):
+		# type: (str, tuple[int, ...] | None, str | None, bool, dict | None, bool) -> None
+		"""
+		@path file to write.
+		@hash_shape shape of the hashes, e.g. (8, 8).
+		@algorithm name of the hash function, e.g. 'phash'.
+		@ids whether every hash is stored with an integer id.
+		@metadata further JSON-serializable information to store in the header, e.g. hash parameters.
+		@append continue an existing store (its header is kept) instead of overwriting it.
+		"""
+		if append and os.path.exists(path):
+			with open(path, 'rb') as f:
+				metadata, self._count, offset = _read_header(f)
+			if hash_shape is not None and tuple(hash_shape) != tuple(metadata['hash_shape']):
+				raise ValueError('Store holds hashes of shape {}, not {}.'.format(tuple(metadata['hash_shape']), tuple(hash_shape)))
+			self.metadata = metadata
+			self._file = open(path, 'r+b')  # noqa: SIM115
+		else:
+			if hash_shape is None:
+				raise ValueError('hash_shape is required for a new store.')
+			self.metadata = dict(metadata or {}, algorithm=algorithm, hash_shape=list(hash_shape), ids=bool(ids))
+			encoded = json.dumps(self.metadata).encode('utf-8')
+			offset = -(-(_PREFIX.size + len(encoded)) // _ALIGNMENT) * _ALIGNMENT
+			self._file = open(path, 'w+b')  # noqa: SIM115
+			self._file.write(_PREFIX.pack(MAGIC, VERSION, len(encoded), 0) + encoded)
+			self._count = 0
+		self._hashes = HashArray(hash_shape=tuple(self.metadata['hash_shape']))
+		self._dtype = _record_dtype(self._hashes._width, self.metadata['ids'])
+		# drop records written after the last header update (e.g. of an interrupted writer)
+		self._file.truncate(offset + self._count * self._dtype.itemsize)
+		self._file.seek(0, os.SEEK_END)
+		self._file.write(b'\0' * (offset - self._file.tell()))
+
+	def __len__(self):
+		return self._count
+
+	def append(self, image_hash, id=None):  # noqa: A002
+		# type: (ImageHash, int | None) -> None
+		self.extend([image_hash], None if id is None else [id])
+
+	def extend(self, hashes, ids=None):
+		# type: (Iterable[ImageHash] | HashArray, Iterable[int] | None) -> None
+		"""
+		Writes @hashes (ImageHash objects or a HashArray), with their @ids if the store has ids.
+		"""
+		rows = HashArray(hash_shape=self._hashes.hash_shape)
+		rows.extend(hashes)
+		if self.metadata['ids']:
+			ids = numpy.asarray(ids if ids is not None else [], dtype=numpy.int64)
+			if len(ids) != len(rows):
+				raise ValueError('Expected one id per hash, got {} ids for {} hashes.'.format(len(ids), len(rows)))
+			records = numpy.zeros(len(rows), dtype=self._dtype)
+			records['hash'] = rows._data[:len(rows)]
+			records['id'] = ids
+		elif ids is not None:
+			raise ValueError('This store has no ids.')
+		else:
+			records = rows._data[:len(rows)]
+		self._file.write(records.tobytes())
+		self._count += len(rows)
+
+	def flush(self):
+		# type: () -> None
+		"""
+		Updates the number of hashes in the header and flushes the file.
+		"""
+		self._file.flush()
+		self._file.seek(_PREFIX.size - 8)
+		self._file.write(struct.pack('<Q', self._count))
+		self._file.seek(0, os.SEEK_END)
+		self._file.flush()
+
+	def close(self):
+		# type: () -> None
+		if not self._file.closed:
+			self.flush()
+			self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+def write_store(path, hashes, algorithm=None, ids=None, metadata=None):
+	# type: (str, Iterable[ImageHash] | HashArray, str | None, Iterable[int] | None, dict | None) -> None
+	"""
+	Writes @hashes (ImageHash objects or a HashArray) to a new store file at @path.
+
+	@algorithm name of the hash function, e.g. 'phash'.
+	@ids integer id of every hash, e.g. database keys. Not stored if None.
+	@metadata further JSON-serializable information to store in the header.
+	"""
+	if not isinstance(hashes, HashArray):
+		hashes = HashArray(hashes)
+	if hashes.hash_shape is None:
+		raise ValueError('Cannot determine the hash shape of an empty list; pass an empty HashArray with hash_shape.')
+	with HashStoreWriter(path, hashes.hash_shape, algorithm=algorithm, ids=ids is not None, metadata=metadata) as writer:
+		writer.extend(hashes, ids)
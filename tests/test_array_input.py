@@ -0,0 +1,91 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy
+from PIL import Image
+
+import imagehash
+import imagehash.batch
+
+from .utils import TestImageHash
+
+
+class Test(TestImageHash):
+	def setUp(self):
+		image = self.get_data_image()
+		peppers = self.get_data_image('peppers.png')
+		rng = numpy.random.RandomState(20)
+		self.arrays = [
+			numpy.asarray(image.convert('RGB')),
+			numpy.asarray(peppers.convert('RGB')),
+			numpy.asarray(peppers.convert('L')),
+			numpy.asarray(image.convert('RGBA').rotate(30)),
+			rng.randint(0, 256, size=(71, 53, 3)).astype(numpy.uint8),
+			# Pillow resizes images more than 100 times taller than wide vertically first
+			rng.randint(0, 256, size=(520, 5)).astype(numpy.uint8),
+		]
+
+	def check_same_as_image(self, func, pixels, **kwargs):
+		expected = func(Image.fromarray(pixels), **kwargs)
+		inputs = [pixels, numpy.asfortranarray(pixels), memoryview(numpy.ascontiguousarray(pixels))]
+		for image in inputs:
+			self.assertEqual(str(func(image, **kwargs)), str(expected), func.__name__)
+
+	def test_hash_funcs(self):
+		for pixels in self.arrays:
+			for func in imagehash.HASH_FUNCS.values():
+				self.check_same_as_image(func, pixels)
+			self.check_same_as_image(imagehash.phash, pixels, hash_size=16)
+			self.check_same_as_image(imagehash.whash, pixels, max_image_scale=64)
+			self.check_same_as_image(imagehash.colorhash, pixels, sample_size=32)
+
+	def test_views(self):
+		# non-contiguous views, such as crops of a frame or a single channel
+		pixels = self.arrays[1]
+		for view in [pixels[10:200, 300:], pixels[::3, ::2], pixels[:, :, 1]]:
+			for func in imagehash.HASH_FUNCS.values():
+				self.check_same_as_image(func, view)
+
+	def test_crop_resistant_hash(self):
+		for pixels in self.arrays[:4]:
+			for hash_func in (imagehash.dhash, imagehash.colorhash):
+				expected = imagehash.crop_resistant_hash(Image.fromarray(pixels), hash_func, min_segment_size=500)
+				image_hash = imagehash.crop_resistant_hash(pixels, hash_func, min_segment_size=500)
+				self.assertEqual(str(image_hash), str(expected))
+
+	def test_compute_hashes(self):
+		for pixels in self.arrays:
+			expected = imagehash.compute_hashes(Image.fromarray(pixels), list(imagehash.HASH_FUNCS))
+			hashes = imagehash.compute_hashes(pixels, list(imagehash.HASH_FUNCS))
+			for name in imagehash.HASH_FUNCS:
+				self.assertEqual(str(hashes[name]), str(expected[name]), name)
+
+	def test_batch(self):
+		for func, batch_func in [
+			(imagehash.average_hash, imagehash.batch.average_hash), (imagehash.phash, imagehash.batch.phash),
+			(imagehash.dhash, imagehash.batch.dhash), (imagehash.colorhash, imagehash.batch.colorhash),
+		]:
+			hashes = batch_func(self.arrays)
+			for pixels, image_hash in zip(self.arrays, hashes):
+				self.assertEqual(image_hash, func(Image.fromarray(pixels)))
+
+	def test_gray_conversion(self):
+		# every RGB color
+		colors = numpy.arange(1 << 24, dtype=numpy.uint32).view(numpy.uint8).reshape((4096, 4096, 4))
+		for pixels in (colors, colors[:, :, :3]):
+			expected = numpy.asarray(Image.fromarray(numpy.ascontiguousarray(pixels)).convert('L'))
+			self.assertTrue(numpy.array_equal(imagehash._gray_pixels(pixels), expected))
+
+	def test_invalid(self):
+		for pixels in [
+			numpy.zeros((10, 10), dtype=numpy.float32), numpy.zeros((10, 10, 2), dtype=numpy.uint8),
+			numpy.zeros(100, dtype=numpy.uint8), b'\0' * 100,
+		]:
+			for func in imagehash.HASH_FUNCS.values():
+				with self.assertRaises(ValueError):
+					func(pixels)
+
+
+if __name__ == '__main__':
+	unittest.main()
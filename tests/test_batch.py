@@ -0,0 +1,77 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy
+
+import imagehash
+import imagehash.batch
+
+from .utils import TestImageHash
+
+
+class Test(TestImageHash):
+	def setUp(self):
+		self.image = self.get_data_image()
+		self.peppers = self.get_data_image('peppers.png')
+		self.images = [
+			self.image, self.peppers, self.image.rotate(-1), self.peppers.rotate(90),
+			self.peppers.convert('L'), self.image.crop((0, 0, 100, 60)),
+		]
+
+	def check_batch_equal(self, batch_func, func, **kwargs):
+		hashes = batch_func(self.images, **kwargs)
+		self.assertEqual(len(hashes), len(self.images))
+		for image, batch_hash in zip(self.images, hashes):
+			expected = func(image, **kwargs)
+			emsg = 'batch hash {} != single image hash {}'.format(batch_hash, expected)
+			self.assertEqual(batch_hash.hash.shape, expected.hash.shape, emsg)
+			self.assertTrue(numpy.array_equal(batch_hash.hash, expected.hash), emsg)
+
+	def test_average_hash(self):
+		for hash_size in (2, 8, 13):
+			self.check_batch_equal(imagehash.batch.average_hash, imagehash.average_hash, hash_size=hash_size)
+		self.check_batch_equal(imagehash.batch.average_hash, imagehash.average_hash, mean=numpy.median)
+		self.check_batch_equal(imagehash.batch.average_hash, imagehash.average_hash, mean=lambda pixels: 100)
+
+	def test_phash(self):
+		for hash_size in (2, 8, 16):
+			self.check_batch_equal(imagehash.batch.phash, imagehash.phash, hash_size=hash_size)
+		self.check_batch_equal(imagehash.batch.phash, imagehash.phash, highfreq_factor=2)
+
+	def test_dhash(self):
+		for hash_size in (2, 8, 13):
+			self.check_batch_equal(imagehash.batch.dhash, imagehash.dhash, hash_size=hash_size)
+
+	def test_colorhash(self):
+		for binbits in (1, 3, 4):
+			self.check_batch_equal(imagehash.batch.colorhash, imagehash.colorhash, binbits=binbits)
+		self.check_batch_equal(imagehash.batch.colorhash, imagehash.colorhash, sample_size=32)
+		self.assertEqual(imagehash.batch.colorhash([]).hash_shape, (14, 3))
+		with self.assertRaises(ValueError):
+			imagehash.batch.colorhash(self.images, binbits=0)
+
+	def test_reduced_grids(self):
+		grids = numpy.stack([numpy.asarray(image.convert('L').resize((9, 8), imagehash.ANTIALIAS)) for image in self.images])
+		hashes = imagehash.batch.dhash(grids)
+		for image, batch_hash in zip(self.images, hashes):
+			self.assertEqual(batch_hash, imagehash.dhash(image))
+		with self.assertRaises(ValueError):
+			imagehash.batch.average_hash(grids)
+		for dtype in (numpy.float64, numpy.int16, bool):
+			with self.assertRaises(ValueError):
+				imagehash.batch.dhash(grids.astype(dtype))
+
+	def test_empty(self):
+		hashes = imagehash.batch.average_hash([])
+		self.assertEqual(len(hashes), 0)
+		self.assertEqual(hashes.hash_shape, (8, 8))
+
+	def test_hash_size(self):
+		for func in (imagehash.batch.average_hash, imagehash.batch.phash, imagehash.batch.dhash):
+			with self.assertRaises(ValueError):
+				func(self.images, hash_size=1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,139 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent import futures
+
+import numpy
+
+import imagehash
+import imagehash.cache
+
+from .utils import TestImageHash
+
+
+def _store_entries(path, worker, count):
+	# writes count entries from another process
+	with imagehash.cache.HashCache(path, timeout=120) as cache:
+		for i in range(count):
+			image_hash = imagehash.ImageHash(numpy.random.RandomState(i).rand(8, 8) > 0.5)
+			cache.store(('/images/{}/{}.png'.format(worker, i), i, 0, None), 'phash', image_hash)
+	return count
+
+
+class Test(TestImageHash):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmpdir, 'hashes.sqlite')
+		self.image_path = os.path.join(self.tmpdir, 'peppers.png')
+		self.get_data_image('peppers.png').save(self.image_path)
+		self.calls = []
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def counting_hash(self, image, **kwargs):
+		self.calls.append(kwargs)
+		return imagehash.phash(image, **kwargs)
+
+	def test_roundtrip(self):
+		image = self.get_data_image()
+		hashes = [
+			imagehash.phash(image), imagehash.phash(image, hash_size=5), imagehash.colorhash(image),
+			imagehash.crop_resistant_hash(image, min_segment_size=500), imagehash.ImageMultiHash([]),
+		]
+		with imagehash.cache.HashCache(self.path) as cache:
+			key = cache.file_key(self.image_path)
+			for i, image_hash in enumerate(hashes):
+				cache.store(key, 'algorithm{}'.format(i), image_hash)
+			for i, image_hash in enumerate(hashes):
+				cached = cache.lookup(key, 'algorithm{}'.format(i))
+				self.assertEqual(type(cached), type(image_hash))
+				self.assertEqual(str(cached), str(image_hash))
+			self.assertEqual(len(cache), len(hashes))
+
+	def test_hash_file(self):
+		expected = imagehash.hash_file(self.image_path, imagehash.phash, exact=True)
+		with imagehash.cache.HashCache(self.path) as cache:
+			for _ in range(3):
+				self.assertEqual(cache.hash_file(self.image_path, self.counting_hash), expected)
+			self.assertEqual(len(self.calls), 1)
+			# parameters are part of the key
+			image_hash = cache.hash_file(self.image_path, self.counting_hash, hash_size=16)
+			self.assertEqual(image_hash.hash.shape, (16, 16))
+			self.assertEqual(len(self.calls), 2)
+		# the cache persists
+		with imagehash.cache.HashCache(self.path) as cache:
+			self.assertEqual(cache.hash_file(self.image_path, self.counting_hash), expected)
+			self.assertEqual(len(self.calls), 2)
+
+	def test_decode_mode(self):
+		# hashes of images decoded at reduced size are not mixed up with the exact ones
+		exact = imagehash.hash_file(self.image_path, imagehash.phash, exact=True)
+		reduced = imagehash.hash_file(self.image_path, imagehash.phash, exact=False)
+		with imagehash.cache.HashCache(self.path) as cache:
+			self.assertEqual(cache.hash_file(self.image_path, imagehash.phash, exact=False), reduced)
+			self.assertIsNone(cache.get(self.image_path, 'phash'))
+			self.assertEqual(cache.get(self.image_path, 'phash {"exact": false}'), reduced)
+			self.assertEqual(cache.hash_file(self.image_path, imagehash.phash), exact)
+			self.assertEqual(cache.get(self.image_path, 'phash'), exact)
+			self.assertEqual(len(cache), 2)
+
+	def test_modified(self):
+		with imagehash.cache.HashCache(self.path) as cache:
+			cache.hash_file(self.image_path, self.counting_hash)
+			stat = os.stat(self.image_path)
+			os.utime(self.image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+			self.assertIsNone(cache.get(self.image_path, 'counting_hash'))
+			cache.hash_file(self.image_path, self.counting_hash)
+			self.assertEqual(len(self.calls), 2)
+			self.assertIsNotNone(cache.get(self.image_path, 'counting_hash'))
+
+	def test_digest(self):
+		with imagehash.cache.HashCache(self.path, digest=True) as cache:
+			cache.hash_file(self.image_path, imagehash.phash)
+			# change the contents, but keep size and modification time
+			stat = os.stat(self.image_path)
+			with open(self.image_path, 'r+b') as f:
+				f.seek(stat.st_size - 20)
+				f.write(b'\0' * 20)
+			os.utime(self.image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+			self.assertIsNone(cache.get(self.image_path, 'phash'))
+		with imagehash.cache.HashCache(self.path) as cache:
+			self.assertIsNotNone(cache.get(self.image_path, 'phash'))
+
+	def test_version(self):
+		with imagehash.cache.HashCache(self.path) as cache:
+			cache.hash_file(self.image_path, self.counting_hash)
+			version = imagehash.cache.HASH_VERSION
+			imagehash.cache.HASH_VERSION = version + 1
+			try:
+				self.assertIsNone(cache.get(self.image_path, 'counting_hash'))
+				cache.hash_file(self.image_path, self.counting_hash)
+				self.assertIsNotNone(cache.get(self.image_path, 'counting_hash'))
+			finally:
+				imagehash.cache.HASH_VERSION = version
+			self.assertIsNone(cache.get(self.image_path, 'counting_hash'))
+		self.assertEqual(len(self.calls), 2)
+
+	def test_algorithm_key(self):
+		self.assertEqual(imagehash.cache.algorithm_key(imagehash.phash), 'phash')
+		self.assertEqual(imagehash.cache.algorithm_key(imagehash.whash, mode='db4'), 'whash {"mode": "db4"}')
+		self.assertEqual(
+			imagehash.cache.algorithm_key(imagehash.average_hash, mean=numpy.median, hash_size=16),
+			imagehash.cache.algorithm_key('average_hash', hash_size=16, mean=numpy.median))
+
+	def test_concurrent_writers(self):
+		with futures.ProcessPoolExecutor(max_workers=4) as executor:
+			jobs = [executor.submit(_store_entries, self.path, worker, 100) for worker in range(4)]
+			self.assertEqual(sum(job.result() for job in jobs), 400)
+		with imagehash.cache.HashCache(self.path) as cache:
+			self.assertEqual(len(cache), 400)
+			expected = imagehash.ImageHash(numpy.random.RandomState(7).rand(8, 8) > 0.5)
+			self.assertEqual(cache.lookup(('/images/3/7.png', 7, 0, None), 'phash'), expected)
+
+
+if __name__ == '__main__':
+	unittest.main()
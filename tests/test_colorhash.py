@@ -2,6 +2,9 @@ from __future__ import absolute_import, division, print_function
 
 import unittest
 
+import numpy
+from PIL import Image
+
 import imagehash
 
 from .utils import TestImageHash
@@ -10,6 +13,37 @@ CHECK_HASH_DEFAULT = range(2, 5)
 CHECK_HASH_SIZE_DEFAULT = range(-1, 1)
 
 
+def _reference_colorhash(image, binbits=3):
+	# the original colorhash with masks and numpy.histogram, as reference
+	intensity = numpy.asarray(image.convert('L')).flatten()
+	h, s, v = [numpy.asarray(v).flatten() for v in image.convert('HSV').split()]
+	mask_black = intensity < 256 // 8
+	frac_black = mask_black.mean()
+	mask_gray = s < 256 // 3
+	frac_gray = numpy.logical_and(~mask_black, mask_gray).mean()
+	mask_colors = numpy.logical_and(~mask_black, ~mask_gray)
+	mask_faint_colors = numpy.logical_and(mask_colors, s < 256 * 2 // 3)
+	mask_bright_colors = numpy.logical_and(mask_colors, s > 256 * 2 // 3)
+	c = max(1, mask_colors.sum())
+	hue_bins = numpy.linspace(0, 255, 6 + 1)
+	if mask_faint_colors.any():
+		h_faint_counts, _ = numpy.histogram(h[mask_faint_colors], bins=hue_bins)
+	else:
+		h_faint_counts = numpy.zeros(len(hue_bins) - 1)
+	if mask_bright_colors.any():
+		h_bright_counts, _ = numpy.histogram(h[mask_bright_colors], bins=hue_bins)
+	else:
+		h_bright_counts = numpy.zeros(len(hue_bins) - 1)
+	maxvalue = 2**binbits
+	values = [min(maxvalue - 1, int(frac_black * maxvalue)), min(maxvalue - 1, int(frac_gray * maxvalue))]
+	for counts in list(h_faint_counts) + list(h_bright_counts):
+		values.append(min(maxvalue - 1, int(counts / c * maxvalue)))
+	bitarray = []
+	for v in values:
+		bitarray += [v // (2**(binbits - i - 1)) % 2**(binbits - i) > 0 for i in range(binbits)]
+	return imagehash.ImageHash(numpy.asarray(bitarray).reshape((-1, binbits)))
+
+
 class Test(TestImageHash):
 	def setUp(self):
 		self.image = self.get_data_image()
@@ -62,5 +96,43 @@ class Test(TestImageHash):
 				func(image, bit)
 
 
+class TestReference(TestImageHash):
+	def setUp(self):
+		image = self.get_data_image()
+		peppers = self.get_data_image('peppers.png')
+		rng = numpy.random.RandomState(19)
+		self.images = [
+			image, peppers, peppers.convert('L'), peppers.convert('P'), image.convert('RGBA').rotate(20),
+			image.crop((0, 0, 30, 20)), Image.new('RGB', (20, 10), 'black'), Image.new('RGB', (20, 10), 'gray'),
+			# random colors, including saturations and hues at the bin edges
+			Image.fromarray(rng.randint(0, 256, size=(300, 400, 3)).astype(numpy.uint8)),
+		]
+		for n_colors in (2, 5, 30):
+			palette = rng.randint(0, 256, size=(n_colors, 3)).astype(numpy.uint8)
+			self.images.append(Image.fromarray(palette[rng.randint(0, n_colors, size=(50, 70))]))
+
+	def test_same_as_reference(self):
+		for image in self.images:
+			for binbits in (1, 3, 4, 8):
+				expected = _reference_colorhash(image, binbits)
+				image_hash = imagehash.colorhash(image, binbits)
+				self.assertEqual(str(image_hash), str(expected))
+				self.assertEqual(image_hash.hash.shape, expected.hash.shape)
+
+	def test_sample_size(self):
+		image = self.get_data_image('peppers.png').convert('RGB')
+		for size in [(600, 600), (2000, 1500)]:
+			resized = image.resize(size, Image.BICUBIC)
+			counts = imagehash._colorhash_counts(resized)
+			for sample_size in (64, 256, 512):
+				sampled = imagehash._colorhash_counts(resized, sample_size)
+				error = numpy.abs(sampled / sampled.sum() - counts / counts.sum()).max()
+				self.assertLess(error, 1 / sample_size)
+				image_hash = imagehash.colorhash(resized, sample_size=sample_size)
+				self.assertEqual(image_hash, imagehash.colorhash(resized))
+		# a larger sample than the image uses the whole image
+		self.assertEqual(str(imagehash.colorhash(image, 8, sample_size=1000)), str(imagehash.colorhash(image, 8)))
+
+
 if __name__ == '__main__':
 	unittest.main()
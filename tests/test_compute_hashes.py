@@ -0,0 +1,54 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy
+from PIL import Image
+
+import imagehash
+
+from .utils import TestImageHash
+
+
+class Test(TestImageHash):
+	def setUp(self):
+		self.images = [self.get_data_image(), self.get_data_image('peppers.png')]
+		self.images += [self.images[1].convert('L'), self.images[1].convert('RGBA').crop((10, 20, 300, 200))]
+		noise = numpy.random.RandomState(12).randint(0, 256, size=(389, 517, 3)).astype(numpy.uint8)
+		self.images.append(Image.fromarray(noise))
+		# Pillow resizes images more than 100 times taller than wide vertically first
+		self.images.append(Image.fromarray(noise[:, :3, 0].repeat(100, axis=0)))
+
+	def test_same_as_functions(self):
+		for image in self.images:
+			hashes = imagehash.compute_hashes(image, list(imagehash.HASH_FUNCS))
+			self.assertEqual(sorted(hashes), sorted(imagehash.HASH_FUNCS))
+			for name, func in imagehash.HASH_FUNCS.items():
+				self.assertEqual(hashes[name], func(image), name)
+				self.assertEqual(str(hashes[name]), str(func(image)), name)
+
+	def test_parameters(self):
+		algorithms = {
+			'average_hash': dict(hash_size=16),
+			'phash': dict(hash_size=4, highfreq_factor=8),
+			'phash_simple': dict(hash_size=4, highfreq_factor=8),
+			'dhash': dict(hash_size=12),
+			'whash': dict(mode='db4', image_scale=64),
+			'colorhash': dict(binbits=4),
+		}
+		for image in self.images:
+			hashes = imagehash.compute_hashes(image, algorithms)
+			for name, kwargs in algorithms.items():
+				self.assertEqual(str(hashes[name]), str(imagehash.HASH_FUNCS[name](image, **kwargs)), name)
+
+	def test_unknown(self):
+		with self.assertRaises(ValueError):
+			imagehash.compute_hashes(self.images[0], ['md5'])
+		with self.assertRaises(TypeError):
+			imagehash.compute_hashes(self.images[0], {'dhash': dict(binbits=3)})
+		with self.assertRaises(ValueError):
+			imagehash.compute_hashes(self.images[0], {'dhash': dict(hash_size=1)})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,13 +1,37 @@
 from __future__ import absolute_import, division, print_function
 
+import pickle
 import unittest
 from datetime import datetime
 
+import numpy
+from PIL import ImageFilter
+
 import imagehash
 
 from .utils import TestImageHash
 
 
+def _per_segment_hash(image, hash_func, limit_segments=None, min_segment_size=500, size=300):
+	# crop and hash each segment of _find_all_segments on its own, as crop_resistant_hash did originally
+	gray = image.convert('L').resize((size, size), imagehash.ANTIALIAS)
+	gray = gray.filter(ImageFilter.GaussianBlur()).filter(ImageFilter.MedianFilter())
+	segments = imagehash._find_all_segments(numpy.array(gray).astype(numpy.float32), 128, min_segment_size)
+	if not segments:
+		segments = [{(0, 0), (size - 1, size - 1)}]
+	if limit_segments:
+		segments = sorted(segments, key=len, reverse=True)[:limit_segments]
+	scale_w = float(image.size[0]) / size
+	scale_h = float(image.size[1]) / size
+	hashes = []
+	for segment in segments:
+		rows = [coord[0] for coord in segment]
+		cols = [coord[1] for coord in segment]
+		box = (min(cols) * scale_w, min(rows) * scale_h, (max(cols) + 1) * scale_w, (max(rows) + 1) * scale_h)
+		hashes.append(hash_func(image.crop(box)))
+	return imagehash.ImageMultiHash(hashes)
+
+
 class Test(TestImageHash):
 	def setUp(self):
 		self.image = self.get_data_image()
@@ -31,6 +55,71 @@ class Test(TestImageHash):
 			'Hash of the slightly rotated image should be a better match than for the more heavily rotated image.'
 		)
 
+	def test_same_as_per_segment(self):
+		hash_funcs = [
+			imagehash.average_hash, imagehash.dhash, imagehash.phash, imagehash.whash,
+			imagehash.colorhash, lambda image: imagehash.phash(image, hash_size=4),
+		]
+		for image in (self.image, self.peppers, self.peppers.crop((50, 0, 400, 300))):
+			for hash_func in hash_funcs:
+				for kwargs in ({}, dict(limit_segments=2), dict(min_segment_size=100), dict(min_segment_size=10 ** 6)):
+					expected = _per_segment_hash(image, hash_func, **kwargs)
+					result = imagehash.crop_resistant_hash(image, hash_func, **kwargs)
+					self.assertEqual(str(result), str(expected))
+
+	def test_segmentation(self):
+		segmentation = imagehash.segment_image(self.peppers, min_segment_size=100)
+		self.assertEqual(segmentation.labels.shape, (300, 300))
+		self.assertEqual(len(segmentation), segmentation.labels.max())
+		self.assertEqual(len(segmentation.bounding_boxes(limit_segments=2)), 2)
+		restored = pickle.loads(pickle.dumps(segmentation))
+		for hash_func in (imagehash.dhash, imagehash.phash, imagehash.colorhash):
+			expected = imagehash.crop_resistant_hash(self.peppers, hash_func, min_segment_size=100)
+			for reused in (segmentation, restored):
+				self.assertEqual(str(imagehash.crop_resistant_hash(self.peppers, hash_func, segmentation=reused)), str(expected))
+		with self.assertRaises(ValueError):
+			imagehash.crop_resistant_hash(self.image, segmentation=segmentation)
+		empty = imagehash.segment_image(self.image, min_segment_size=10 ** 6)
+		self.assertEqual(len(empty), 0)
+		self.assertEqual(empty.bounding_boxes(), [(0, 0, self.image.size[0], self.image.size[1])])
+
+	def test_hash_diff(self):
+		rng = numpy.random.RandomState(10)
+		centers = rng.rand(5, 8, 8) > 0.5
+		multihashes = []
+		for _ in range(30):
+			bits = centers[rng.randint(0, 5, size=rng.randint(1, 20))] ^ (rng.rand(1, 8, 8) < 0.15)
+			multihashes.append(imagehash.ImageMultiHash([imagehash.ImageHash(segment) for segment in bits]))
+		for a in multihashes[:10]:
+			for b in multihashes:
+				for hamming_cutoff in (None, 0, 10):
+					lowest = [min(x - y for y in b.segment_hashes) for x in a.segment_hashes]
+					cutoff = 16 if hamming_cutoff is None else hamming_cutoff
+					within = [distance for distance in lowest if distance <= cutoff]
+					self.assertEqual(a.hash_diff(b, hamming_cutoff), (len(within), sum(within)))
+					for region_cutoff in (1, 3, 15):
+						self.assertEqual(a.matches(b, region_cutoff, hamming_cutoff), len(within) >= region_cutoff)
+			best = min(multihashes, key=lambda other: a - other)
+			self.assertIs(a.best_match(multihashes), best)
+		with self.assertRaises(TypeError):
+			a.hash_diff(imagehash.ImageMultiHash([imagehash.ImageHash(numpy.zeros((4, 4), dtype=bool))]))
+
+	def test_no_segments(self):
+		# a multi-hash without segments matches nothing, instead of failing
+		a = imagehash.crop_resistant_hash(self.image)
+		empty = imagehash.ImageMultiHash([])
+		for x, y in ((a, empty), (empty, a), (empty, empty)):
+			self.assertEqual(x.hash_diff(y), (0, 0))
+			self.assertEqual(x.hash_diff(y, 10), (0, 0))
+			self.assertFalse(x.matches(y))
+			self.assertTrue(x.matches(y, region_cutoff=0))
+			self.assertEqual(x - y, len(x.segment_hashes))
+		self.assertIs(a.best_match([empty, a]), a)
+		self.assertIs(empty.best_match([a, empty]), a)
+		index = imagehash.SegmentIndex([a, empty])
+		self.assertEqual(index.best_match(a), 0)
+		self.assertEqual(index.best_match(empty), 0)
+
 	def test_segmented_hash__hash_func(self):
 		segmented_ahash = imagehash.crop_resistant_hash(self.image, imagehash.average_hash)
 		segmented_dhash = imagehash.crop_resistant_hash(self.image, imagehash.dhash)
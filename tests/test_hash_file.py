@@ -0,0 +1,63 @@
+from __future__ import absolute_import, division, print_function
+
+import io
+import os
+import unittest
+
+from PIL import Image
+
+import imagehash
+
+from .utils import TestImageHash
+
+
+class Test(TestImageHash):
+	def setUp(self):
+		dname = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
+		self.paths = [os.path.join(dname, name) for name in ('imagehash.png', 'peppers.png')]
+		self.jpegs = []
+		for path in self.paths:
+			image = Image.open(path).convert('RGB')
+			for size in [(300, 200), (2000, 1500)]:
+				data = io.BytesIO()
+				image.resize(size, Image.BICUBIC).save(data, 'JPEG', quality=90)
+				self.jpegs.append(data.getvalue())
+
+	def test_exact(self):
+		for name, func in imagehash.HASH_FUNCS.items():
+			for path in self.paths:
+				self.assertEqual(str(imagehash.hash_file(path, func, exact=True)), str(func(Image.open(path))), name)
+			for data in self.jpegs:
+				expected = func(Image.open(io.BytesIO(data)))
+				self.assertEqual(str(imagehash.hash_bytes(data, func, exact=True)), str(expected), name)
+
+	def test_drift(self):
+		cases = [
+			(imagehash.average_hash, {}), (imagehash.average_hash, dict(hash_size=16)),
+			(imagehash.dhash, {}), (imagehash.dhash_vertical, {}),
+			(imagehash.phash, {}), (imagehash.phash, dict(hash_size=16)), (imagehash.phash_simple, {}),
+			(imagehash.whash, dict(image_scale=64)),
+		]
+		for func, kwargs in cases:
+			for data in self.jpegs:
+				expected = func(Image.open(io.BytesIO(data)), **kwargs)
+				image_hash = imagehash.hash_bytes(data, func, **kwargs)
+				self.assertLess(image_hash - expected, 0.1 * len(expected), func.__name__)
+
+	def test_whash_scale(self):
+		# the natural image scale of whash is taken from the size of the file, not of the decoded image
+		for data in self.jpegs:
+			expected = imagehash.whash(Image.open(io.BytesIO(data)))
+			self.assertEqual(imagehash.hash_bytes(data, imagehash.whash), expected)
+			expected = imagehash.whash(Image.open(io.BytesIO(data)), max_image_scale=64)
+			self.assertEqual(imagehash.hash_bytes(data, imagehash.whash, max_image_scale=64), expected)
+
+	def test_kwargs(self):
+		image_hash = imagehash.hash_file(self.paths[1], imagehash.phash, hash_size=16)
+		self.assertEqual(image_hash.hash.shape, (16, 16))
+		image_hash = imagehash.hash_file(self.paths[1], imagehash.colorhash, binbits=4)
+		self.assertEqual(image_hash, imagehash.colorhash(Image.open(self.paths[1]), binbits=4))
+
+
+if __name__ == '__main__':
+	unittest.main()
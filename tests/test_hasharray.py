@@ -0,0 +1,93 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy
+
+import imagehash
+
+
+class Test(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(3)
+		self.shapes = [(8, 8), (3, 3), (1, 42), (16, 16)]
+		self.hashes = {shape: [imagehash.ImageHash(bits) for bits in rng.rand(300, *shape) > 0.5] for shape in self.shapes}
+
+	def test_roundtrip(self):
+		for shape, hashes in self.hashes.items():
+			array = imagehash.HashArray(hashes)
+			self.assertEqual(len(array), len(hashes))
+			self.assertEqual(array.hash_shape, shape)
+			self.assertEqual(list(array), hashes)
+			self.assertEqual(array[-1], hashes[-1])
+			self.assertTrue(numpy.array_equal(array.to_bool(), numpy.array([h.hash for h in hashes])))
+			self.assertEqual(list(imagehash.HashArray.from_bool(array.to_bool())), hashes)
+			self.assertEqual(list(imagehash.HashArray.from_packed(array.packed, shape)), hashes)
+			if shape[0] == shape[1]:
+				from_hex = imagehash.HashArray.from_hex([str(h) for h in hashes])
+				self.assertEqual(list(from_hex), hashes)
+
+	def test_queries(self):
+		for hashes in self.hashes.values():
+			array = imagehash.HashArray(hashes)
+			query = hashes[7]
+			expected = numpy.array([query - other for other in hashes])
+			distances = array.distances(query)
+			self.assertTrue(numpy.array_equal(distances, expected))
+			radius = int(numpy.median(expected))
+			self.assertTrue(numpy.array_equal(array.within(query, radius), numpy.flatnonzero(expected <= radius)))
+			indices, topk_distances = array.topk(query, 10)
+			order = sorted(range(len(hashes)), key=lambda i: (expected[i], i))[:10]
+			self.assertEqual(list(indices), order)
+			self.assertEqual(list(topk_distances), list(expected[order]))
+			self.assertEqual(len(array.topk(query, 1000)[0]), len(hashes))
+
+	def test_blocks(self):
+		hashes = self.hashes[(8, 8)]
+		array = imagehash.HashArray(hashes)
+		block_size = imagehash.hasharray.BLOCK_SIZE
+		try:
+			imagehash.hasharray.BLOCK_SIZE = 16
+			query = hashes[0]
+			self.assertTrue(numpy.array_equal(array.distances(query), [query - other for other in hashes]))
+			indices, _ = array.topk(query, 5)
+			self.assertEqual(list(indices), sorted(range(len(hashes)), key=lambda i: (query - hashes[i], i))[:5])
+		finally:
+			imagehash.hasharray.BLOCK_SIZE = block_size
+
+	def test_append_and_slice(self):
+		hashes = self.hashes[(8, 8)]
+		array = imagehash.HashArray()
+		for image_hash in hashes[:100]:
+			array.append(image_hash)
+		array.extend(hashes[100:])
+		self.assertEqual(list(array), hashes)
+		view = array[10:20]
+		self.assertTrue(numpy.shares_memory(view.packed, array.packed))
+		self.assertEqual(list(view), hashes[10:20])
+		view.append(hashes[0])
+		self.assertEqual(list(array), hashes)
+		self.assertEqual(list(view), hashes[10:20] + hashes[:1])
+		self.assertEqual(list(array[[3, 1]]), [hashes[3], hashes[1]])
+		array.extend(array[:5])
+		self.assertEqual(list(array), hashes + hashes[:5])
+
+	def test_shape_mismatch(self):
+		array = imagehash.HashArray(self.hashes[(8, 8)])
+		with self.assertRaises(TypeError):
+			array.append(self.hashes[(3, 3)][0])
+		with self.assertRaises(TypeError):
+			array.distances(self.hashes[(16, 16)][0])
+		with self.assertRaises(ValueError):
+			imagehash.HashArray.from_packed(numpy.zeros((2, 3), dtype=numpy.uint8), (8, 8))
+
+	def test_empty(self):
+		array = imagehash.HashArray(hash_shape=(8, 8))
+		query = self.hashes[(8, 8)][0]
+		self.assertEqual(len(array.distances(query)), 0)
+		self.assertEqual(len(array.within(query, 10)), 0)
+		self.assertEqual(len(array.topk(query, 3)[0]), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -97,6 +97,33 @@ class TestHexConversions(unittest.TestCase):
 			result = ''.join(str(b) for b in 1 * self.from_hex(case[0]).hash.flatten())
 			self.assertEqual(expected, result)
 
+	def test_hex_to_hashes(self):
+		for length in (1, 3, 4, 7, 16, 64):
+			hexstrs = [case[0] for case in hexadecimal_to_binary_values if len(case[0]) == length]
+			if not hexstrs:
+				continue
+			packed = imagehash.hex_to_hashes(hexstrs)
+			for hexstr, row in zip(hexstrs, packed):
+				image_hash = self.from_hex(hexstr)
+				self.assertEqual(row.tobytes(), int(hexstr, 16).to_bytes(len(row), 'big'))
+				self.assertEqual(len(row), (len(image_hash) + 7) // 8)
+
+	def test_hex_to_hashes_flat(self):
+		hexstrs = ['07007000000', '00700700000', '3ff00000001']
+		packed = imagehash.hex_to_hashes(hexstrs, hashsize=42)
+		self.assertEqual(packed.shape, (3, 6))
+		for hexstr, row in zip(hexstrs, packed):
+			self.assertEqual(int.from_bytes(row.tobytes(), 'big'), int(hexstr, 16))
+
+	def test_hex_to_hashes_invalid(self):
+		with self.assertRaises(ValueError):
+			imagehash.hex_to_hashes(['f0f0', 'f0f'])
+		with self.assertRaises(ValueError):
+			imagehash.hex_to_hashes(['101', '301'])
+		with self.assertRaises(ValueError):
+			self.from_hex('301')
+		self.assertEqual(imagehash.hex_to_hashes([]).shape, (0, 0))
+
 
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,38 @@
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import subprocess
+import sys
+
+# import imagehash and hash an image in a fresh interpreter, reporting
+# timings and which of the heavy optional dependencies got loaded
+SCRIPT = '''
+import json, sys, time
+start = time.time()
+import imagehash
+imported = time.time()
+from PIL import Image
+image = Image.open(sys.argv[1])
+for func in (imagehash.average_hash, imagehash.dhash, imagehash.phash, imagehash.phash_simple):
+	func(image)
+hashed = time.time()
+print(json.dumps(dict(
+	import_time=imported - start,
+	first_call_time=hashed - imported,
+	modules=[name for name in ('scipy', 'pywt') if name in sys.modules],
+)))
+'''
+
+
+def test_import_time():
+	parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	image_path = os.path.join(parent_dir, 'tests', 'data', 'imagehash.png')
+	output = subprocess.check_output([sys.executable, '-c', SCRIPT, image_path], cwd=parent_dir)
+	result = json.loads(output.decode().strip().splitlines()[-1])
+	print('import imagehash: %.3fs, first hashes: %.3fs' % (result['import_time'], result['first_call_time']))
+	# neither import nor the luminance hashes should pull in scipy or pywt
+	assert result['modules'] == []
+	# generous bounds; numpy and pillow alone take a good fraction of this
+	assert result['import_time'] < 5
+	assert result['first_call_time'] < 5
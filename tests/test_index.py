@@ -0,0 +1,174 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+from unittest import mock
+
+import numpy
+
+import imagehash
+import imagehash.hasharray
+import imagehash.index
+
+
+def _clustered_hashes(rng, count, shape, flips):
+	# hashes scattered around a few centers, so that there are near neighbours
+	centers = rng.rand(count // 20 + 1, *shape) > 0.5
+	hashes = []
+	for i in range(count):
+		bits = centers[i % len(centers)].copy()
+		flip = rng.randint(0, bits.size, size=rng.randint(0, flips + 1))
+		bits.flat[flip] = ~bits.flat[flip]
+		hashes.append(imagehash.ImageHash(bits))
+	return hashes
+
+
+class TestBKTree(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(4)
+		self.hashes = _clustered_hashes(rng, 1000, (8, 8), 12)
+		self.queries = _clustered_hashes(rng, 20, (8, 8), 20) + self.hashes[:5]
+
+	def check_search(self, tree, hashes):
+		for query in self.queries:
+			distances = numpy.array([query - other for other in hashes])
+			for radius in (0, 3, 8, 16, 64):
+				indices, found_distances = tree.search(query, radius)
+				expected = sorted(numpy.flatnonzero(distances <= radius), key=lambda i: (distances[i], i))
+				self.assertEqual(list(indices), expected)
+				self.assertEqual(list(found_distances), list(distances[expected]))
+			best = min(range(len(hashes)), key=lambda i: (distances[i], i))
+			self.assertEqual(tree.nearest(query), (best, distances[best]))
+
+	def test_bulk(self):
+		self.check_search(imagehash.BKTree(self.hashes), self.hashes)
+
+	def test_add(self):
+		tree = imagehash.BKTree()
+		for image_hash in self.hashes[:300]:
+			tree.add(image_hash)
+		tree.extend(self.hashes[300:])
+		self.assertEqual(len(tree), len(self.hashes))
+		self.check_search(tree, self.hashes)
+
+	def test_bulk_same_tree(self):
+		bulk = imagehash.BKTree(self.hashes)
+		single = imagehash.BKTree()
+		for image_hash in self.hashes:
+			single.add(image_hash)
+		n = len(self.hashes)
+		self.assertTrue(numpy.array_equal(bulk._edge[:n], single._edge[:n]))
+
+	def test_empty(self):
+		tree = imagehash.BKTree()
+		self.assertEqual(len(tree.search(self.queries[0], 5)[0]), 0)
+		with self.assertRaises(ValueError):
+			tree.nearest(self.queries[0])
+
+	def test_shape_mismatch(self):
+		tree = imagehash.BKTree(self.hashes)
+		with self.assertRaises(TypeError):
+			tree.search(imagehash.ImageHash(numpy.zeros((4, 4), dtype=bool)), 3)
+
+
+class TestMultiIndexHash(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(4)
+		self.hashes = _clustered_hashes(rng, 1000, (8, 8), 12)
+		self.queries = _clustered_hashes(rng, 20, (8, 8), 20) + self.hashes[:5]
+
+	def check_search(self, index, hashes):
+		for query in self.queries:
+			distances = numpy.array([query - other for other in hashes])
+			for radius in (0, 1, 2, 3, 5, 8, 12, 16):
+				indices, found_distances = index.search(query, radius)
+				expected = sorted(numpy.flatnonzero(distances <= radius), key=lambda i: (distances[i], i))
+				self.assertEqual(list(indices), expected)
+				self.assertEqual(list(found_distances), list(distances[expected]))
+				self.assertEqual(index.stats['results'], len(expected))
+				self.assertLessEqual(index.stats['candidates'], len(hashes))
+
+	def test_bulk(self):
+		for substrings in (None, 3, 5, 8):
+			self.check_search(imagehash.MultiIndexHash(self.hashes, substrings), self.hashes)
+
+	def test_hex(self):
+		index = imagehash.MultiIndexHash([str(image_hash) for image_hash in self.hashes])
+		self.check_search(index, self.hashes)
+
+	def test_flat_hashes(self):
+		rng = numpy.random.RandomState(5)
+		hashes = _clustered_hashes(rng, 300, (1, 42), 6)
+		self.queries = hashes[:5]
+		self.check_search(imagehash.MultiIndexHash(hashes, 4), hashes)
+		with self.assertRaises(ValueError):
+			imagehash.MultiIndexHash(_clustered_hashes(rng, 10, (16, 16), 0), 2)
+
+	def test_popcount_fallback(self):
+		# the byte table used with numpy < 2, including on the empty candidate arrays of misses
+		rng = numpy.random.RandomState(6)
+		for dtype in (numpy.uint8, numpy.uint32, numpy.uint64):
+			for shape in ((0,), (0, 3), (5, 0), (7, 3)):
+				words = rng.randint(0, numpy.iinfo(dtype).max, size=shape, dtype=dtype)
+				expected = [bin(int(word)).count('1') for word in words.ravel()]
+				counts = imagehash._bitwise_count_table(words)
+				self.assertEqual(counts.shape, shape)
+				self.assertEqual(counts.ravel().tolist(), expected)
+		fallback = imagehash._bitwise_count_table
+		patch_index = mock.patch.object(imagehash.index, '_bitwise_count', fallback)
+		with patch_index, mock.patch.object(imagehash.hasharray, '_bitwise_count', fallback):
+			self.check_search(imagehash.MultiIndexHash(self.hashes), self.hashes)
+
+	def test_empty(self):
+		index = imagehash.MultiIndexHash(imagehash.HashArray(hash_shape=(8, 8)))
+		self.assertEqual(len(index), 0)
+		self.assertEqual(len(index.search(self.queries[0], 5)[0]), 0)
+
+	def test_shape_mismatch(self):
+		index = imagehash.MultiIndexHash(self.hashes)
+		with self.assertRaises(TypeError):
+			index.search(imagehash.ImageHash(numpy.zeros((4, 4), dtype=bool)), 3)
+
+
+class TestSegmentIndex(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(11)
+		segments = _clustered_hashes(rng, 2000, (8, 8), 10)
+		self.multihashes = []
+		for _ in range(200):
+			chosen = rng.randint(0, len(segments), size=rng.randint(1, 12))
+			self.multihashes.append(imagehash.ImageMultiHash([segments[i] for i in chosen]))
+		# duplicates, so that there are ties
+		self.multihashes += self.multihashes[:10]
+		self.queries = self.multihashes[:20:3] + [
+			imagehash.ImageMultiHash(_clustered_hashes(rng, 5, (8, 8), 12)),
+			imagehash.ImageMultiHash([imagehash.ImageHash(rng.rand(8, 8) > 0.5) for _ in range(3)]),
+		]
+
+	def test_best_match(self):
+		index = imagehash.SegmentIndex(self.multihashes)
+		self.assertEqual(len(index), len(self.multihashes))
+		for query in self.queries:
+			for hamming_cutoff in (None, 0, 5, 20):
+				best = index.best_match(query, hamming_cutoff)
+				expected = query.best_match(self.multihashes, hamming_cutoff)
+				self.assertIs(self.multihashes[best], expected)
+			candidates = index.best_match(query, max_candidates=1, search_radius=4)
+			self.assertLessEqual(query - self.multihashes[candidates], len(query.segment_hashes))
+
+	def test_votes(self):
+		index = imagehash.SegmentIndex(self.multihashes)
+		query = self.queries[0]
+		candidates, votes, sums = index.votes(query, 10)
+		for i, vote, distance_sum in zip(candidates, votes, sums):
+			self.assertEqual(query.hash_diff(self.multihashes[i], 10), (vote, distance_sum))
+		unvoted = sorted(set(range(len(self.multihashes))) - set(candidates))
+		for i in unvoted:
+			self.assertEqual(query.hash_diff(self.multihashes[i], 10)[0], 0)
+
+	def test_empty(self):
+		with self.assertRaises(ValueError):
+			imagehash.SegmentIndex([]).best_match(self.queries[0])
+
+
+if __name__ == '__main__':
+	unittest.main()
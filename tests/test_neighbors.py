@@ -0,0 +1,252 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import imagehash
+import imagehash.neighbors
+
+from .test_index import _clustered_hashes
+
+
+def _components(hashes, threshold):
+	# reference: connected components by a breadth-first search over all pairs
+	labels = [-1] * len(hashes)
+	for start in range(len(hashes)):
+		if labels[start] >= 0:
+			continue
+		labels[start] = start
+		queue = [start]
+		while queue:
+			i = queue.pop()
+			for j in range(len(hashes)):
+				if labels[j] < 0 and hashes[i] - hashes[j] <= threshold:
+					labels[j] = start
+					queue.append(j)
+	return labels
+
+
+class TestRadiusPairs(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(5)
+		self.hashes = _clustered_hashes(rng, 600, (8, 8), 10)
+		self.wide_hashes = _clustered_hashes(rng, 300, (12, 12), 20)
+
+	def check_pairs(self, hashes, radius, method):
+		expected = {
+			(i, j, hashes[i] - hashes[j])
+			for i in range(len(hashes)) for j in range(i + 1, len(hashes)) if hashes[i] - hashes[j] <= radius
+		}
+		found = []
+		for i, j, distances in imagehash.neighbors.radius_pairs(hashes, radius, method):
+			found += zip(i.tolist(), j.tolist(), distances.tolist())
+		self.assertEqual(len(found), len(set(found)))
+		self.assertEqual(set(found), expected)
+
+	def test_blocked(self):
+		for radius in (0, 2, 7):
+			self.check_pairs(self.hashes, radius, 'blocked')
+		self.check_pairs(self.wide_hashes, 15, 'blocked')
+
+	def test_index(self):
+		for radius in (0, 2, 7):
+			self.check_pairs(self.hashes, radius, 'index')
+		self.check_pairs(self.wide_hashes, 15, 'index')
+
+	def test_tiles(self):
+		# pairs across and within several tiles
+		tile_words = imagehash.neighbors.TILE_WORDS
+		imagehash.neighbors.TILE_WORDS = 1000
+		try:
+			self.check_pairs(self.hashes, 5, 'blocked')
+			self.check_pairs(self.wide_hashes, 15, 'blocked')
+		finally:
+			imagehash.neighbors.TILE_WORDS = tile_words
+
+	def test_method(self):
+		self.check_pairs(self.hashes, 4, None)
+		with self.assertRaises(ValueError):
+			list(imagehash.neighbors.radius_pairs(self.hashes, 4, 'brute'))
+
+
+class TestClusterHashes(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(6)
+		self.hashes = _clustered_hashes(rng, 400, (8, 8), 16)
+
+	def test_components(self):
+		for threshold in (0, 3, 6):
+			expected = _components(self.hashes, threshold)
+			for method in ('blocked', 'index'):
+				labels = imagehash.neighbors.cluster_hashes(self.hashes, threshold, method)
+				self.assertEqual(labels.tolist(), expected)
+
+	def test_chain(self):
+		# hashes 0 and 2 are too far apart, but both near hash 1
+		bits = numpy.zeros((4, 8, 8), dtype=bool)
+		bits[1, 0, :3] = True
+		bits[2, 0, :6] = True
+		bits[3] = True
+		hashes = [imagehash.ImageHash(b) for b in bits]
+		self.assertEqual(imagehash.neighbors.cluster_hashes(hashes, 3).tolist(), [0, 0, 0, 3])
+		self.assertEqual(imagehash.neighbors.cluster_hashes(hashes, 2).tolist(), [0, 1, 2, 3])
+
+	def test_inputs(self):
+		expected = imagehash.neighbors.cluster_hashes(self.hashes, 3)
+		hex_strings = [str(image_hash) for image_hash in self.hashes]
+		self.assertEqual(imagehash.neighbors.cluster_hashes(hex_strings, 3).tolist(), expected.tolist())
+		hashes = imagehash.HashArray(self.hashes)
+		self.assertEqual(imagehash.neighbors.cluster_hashes(hashes, 3).tolist(), expected.tolist())
+
+	def test_empty(self):
+		self.assertEqual(len(imagehash.neighbors.cluster_hashes([], 3)), 0)
+		self.assertEqual(imagehash.neighbors.cluster_hashes(self.hashes[:1], 3).tolist(), [0])
+
+
+class TestJoinHashes(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(7)
+		hashes = _clustered_hashes(rng, 700, (8, 8), 10)
+		self.a, self.b = hashes[:200], hashes[200:]
+		segments = _clustered_hashes(rng, 600, (8, 8), 12)
+		self.multihashes_a = [imagehash.ImageMultiHash(segments[i:i + 3]) for i in range(0, 150, 3)]
+		self.multihashes_b = [imagehash.ImageMultiHash(segments[i:i + 1 + i % 4]) for i in range(150, 600, 5)]
+
+	def check_join(self, a, b, radius, expected, method=None):
+		found = []
+		for i, j, distances in imagehash.neighbors.join_hashes(a, b, radius, method):
+			found += zip(i.tolist(), j.tolist(), distances.tolist())
+		self.assertEqual(len(found), len(set(found)))
+		self.assertEqual(set(found), expected)
+
+	def test_join(self):
+		for radius in (0, 3, 8):
+			expected = {
+				(i, j, x - y) for i, x in enumerate(self.a) for j, y in enumerate(self.b) if x - y <= radius
+			}
+			swapped = {(j, i, distance) for i, j, distance in expected}
+			for method in (None, 'blocked', 'index'):
+				self.check_join(self.a, self.b, radius, expected, method)
+				self.check_join(self.b, self.a, radius, swapped, method)
+			self.check_join(self.a, imagehash.MultiIndexHash(self.b), radius, expected)
+			self.check_join(imagehash.MultiIndexHash(self.b), self.a, radius, swapped)
+
+	def test_multihashes(self):
+		radius = 6
+		expected = set()
+		for i, x in enumerate(self.multihashes_a):
+			for j, y in enumerate(self.multihashes_b):
+				distance = min(s - t for s in x.segment_hashes for t in y.segment_hashes)
+				if distance <= radius:
+					expected.add((i, j, distance))
+		self.assertTrue(expected)
+		swapped = {(j, i, distance) for i, j, distance in expected}
+		tile_words = imagehash.neighbors.TILE_WORDS
+		for tiles in (tile_words, 100):
+			# small tiles give many chunks, which must not split a multi-hash
+			imagehash.neighbors.TILE_WORDS = tiles
+			try:
+				for method in ('blocked', 'index'):
+					self.check_join(self.multihashes_a, self.multihashes_b, radius, expected, method)
+					self.check_join(self.multihashes_b, self.multihashes_a, radius, swapped, method)
+			finally:
+				imagehash.neighbors.TILE_WORDS = tile_words
+		self.check_join(self.multihashes_a, imagehash.SegmentIndex(self.multihashes_b), radius, expected)
+
+	def test_mixed(self):
+		# single hashes against the segments of multi-hashes
+		expected = {
+			(i, j, min(x - s for s in y.segment_hashes))
+			for i, x in enumerate(self.a) for j, y in enumerate(self.multihashes_b)
+			if min(x - s for s in y.segment_hashes) <= 8
+		}
+		self.check_join(self.a, self.multihashes_b, 8, expected)
+
+	def test_invalid(self):
+		wide = [imagehash.ImageHash(numpy.zeros((16, 16), dtype=bool))]
+		with self.assertRaises(TypeError):
+			list(imagehash.neighbors.join_hashes(self.a, wide, 3))
+		with self.assertRaises(ValueError):
+			list(imagehash.neighbors.join_hashes(self.a, self.b, 3, 'brute'))
+		self.assertEqual(list(imagehash.neighbors.join_hashes([], self.b, 3)), [])
+		self.assertEqual(list(imagehash.neighbors.join_hashes(self.a, [], 3)), [])
+
+
+class TestPairwiseDistances(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(8)
+		self.hashes = _clustered_hashes(rng, 150, (8, 8), 20)
+		self.expected = numpy.array([[x - y for y in self.hashes] for x in self.hashes])
+		self.tmpdir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def test_square(self):
+		for block_size in (None, 7, 64):
+			for workers in (1, 3):
+				distances = imagehash.neighbors.pairwise_distances(self.hashes, block_size=block_size, workers=workers)
+				self.assertEqual(distances.dtype, numpy.uint8)
+				numpy.testing.assert_array_equal(distances, self.expected)
+
+	def test_condensed(self):
+		upper = self.expected[numpy.triu_indices(len(self.hashes), 1)]
+		for block_size in (None, 7, 64):
+			for workers in (1, 3):
+				distances = imagehash.neighbors.pairwise_distances(
+					self.hashes, 'condensed', block_size=block_size, workers=workers)
+				numpy.testing.assert_array_equal(distances, upper)
+
+	def test_sparse(self):
+		i, j = numpy.nonzero(numpy.triu(self.expected <= 12, 1))
+		expected = set(zip(i.tolist(), j.tolist(), self.expected[i, j].tolist()))
+		for block_size in (None, 7):
+			found = imagehash.neighbors.pairwise_distances(self.hashes, 'sparse', 12, block_size=block_size, workers=3)
+			found = list(zip(*[values.tolist() for values in found]))
+			self.assertEqual(len(found), len(expected))
+			self.assertEqual(set(found), expected)
+
+	def test_long_hashes(self):
+		rng = numpy.random.RandomState(9)
+		hashes = _clustered_hashes(rng, 40, (20, 20), 300)
+		distances = imagehash.neighbors.pairwise_distances(hashes, block_size=16)
+		self.assertEqual(distances.dtype, numpy.uint16)
+		numpy.testing.assert_array_equal(distances, [[x - y for y in hashes] for x in hashes])
+
+	def test_out(self):
+		path = os.path.join(self.tmpdir, 'distances.npy')
+		distances = imagehash.neighbors.pairwise_distances(self.hashes, out=path, max_memory=1 << 16)
+		self.assertIsInstance(distances, numpy.memmap)
+		del distances
+		numpy.testing.assert_array_equal(numpy.load(path, mmap_mode='r'), self.expected)
+		out = numpy.zeros(len(self.hashes) * (len(self.hashes) - 1) // 2, dtype=numpy.int32)
+		distances = imagehash.neighbors.pairwise_distances(self.hashes, 'condensed', out=out)
+		self.assertIs(distances, out)
+		numpy.testing.assert_array_equal(out, self.expected[numpy.triu_indices(len(self.hashes), 1)])
+
+	def test_invalid(self):
+		with self.assertRaises(ValueError):
+			imagehash.neighbors.pairwise_distances(self.hashes, 'triangle')
+		with self.assertRaises(ValueError):
+			imagehash.neighbors.pairwise_distances(self.hashes, 'sparse')
+		for form in ('square', 'condensed'):
+			with self.assertRaises(ValueError):
+				imagehash.neighbors.pairwise_distances(self.hashes, form, 12)
+		with self.assertRaises(ValueError):
+			imagehash.neighbors.pairwise_distances(self.hashes, out=numpy.zeros((150, 149), dtype=numpy.uint8))
+		with self.assertRaises(ValueError):
+			imagehash.neighbors.pairwise_distances(self.hashes, out=numpy.zeros((150, 150), dtype=bool))
+
+	def test_empty(self):
+		self.assertEqual(imagehash.neighbors.pairwise_distances([]).shape, (0, 0))
+		self.assertEqual(imagehash.neighbors.pairwise_distances([], 'condensed').shape, (0,))
+		self.assertEqual([len(values) for values in imagehash.neighbors.pairwise_distances([], 'sparse', 3)], [0, 0, 0])
+		self.assertEqual(imagehash.neighbors.pairwise_distances(self.hashes[:1], 'condensed').shape, (0,))
+
+
+if __name__ == '__main__':
+	unittest.main()
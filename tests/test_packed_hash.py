@@ -0,0 +1,72 @@
+from __future__ import absolute_import, division, print_function
+
+import pickle
+import unittest
+
+import numpy
+
+import imagehash
+
+
+class Test(unittest.TestCase):
+	def setUp(self):
+		rng = numpy.random.RandomState(1)
+		self.arrays = [rng.rand(*shape) > 0.5 for shape in [(2, 2), (3, 3), (5, 5), (8, 8), (16, 16), (1, 42), (14, 3)]]
+
+	def test_roundtrip(self):
+		for array in self.arrays:
+			image_hash = imagehash.ImageHash(array)
+			self.assertEqual(image_hash.hash.shape, array.shape)
+			self.assertEqual(image_hash.hash.dtype, numpy.bool_)
+			self.assertTrue(numpy.array_equal(image_hash.hash, array))
+			self.assertEqual(len(image_hash), array.size)
+			self.assertEqual(str(image_hash), imagehash._binary_array_to_hex(array))
+
+	def test_distance(self):
+		for array in self.arrays:
+			for other in self.arrays:
+				if array.size != other.size:
+					with self.assertRaises(TypeError):
+						imagehash.ImageHash(array) - imagehash.ImageHash(other)
+					continue
+				expected = numpy.count_nonzero(array.flatten() != other.flatten())
+				self.assertEqual(imagehash.ImageHash(array) - imagehash.ImageHash(other), expected)
+				self.assertEqual(imagehash.ImageHash(array) == imagehash.ImageHash(other), expected == 0)
+				self.assertEqual(imagehash.ImageHash(array) != imagehash.ImageHash(other), expected != 0)
+
+	def test_hash(self):
+		rng = numpy.random.RandomState(2)
+		hashes = [imagehash.ImageHash(bits) for bits in rng.rand(5000, 8, 8) > 0.5]
+		self.assertGreater(len(set(hash(image_hash) for image_hash in hashes)), 4900)
+		for image_hash in hashes[:100]:
+			self.assertEqual(hash(image_hash), hash(imagehash.hex_to_hash(str(image_hash))))
+		self.assertEqual(len(set(hashes + hashes[:10])), len(set(hashes)))
+
+	def test_assign_hash(self):
+		image_hash = imagehash.ImageHash(self.arrays[0])
+		image_hash.hash = self.arrays[3]
+		self.assertEqual(image_hash, imagehash.ImageHash(self.arrays[3]))
+
+	def test_read_only_hash(self):
+		# in-place edits of the derived array would be lost, so they are refused
+		image_hash = imagehash.ImageHash(self.arrays[3])
+		with self.assertRaises(ValueError):
+			image_hash.hash[0, 0] = not image_hash.hash[0, 0]
+		self.assertEqual(image_hash, imagehash.ImageHash(self.arrays[3]))
+		bits = image_hash.hash.copy()
+		bits[0, 0] = not bits[0, 0]
+		image_hash.hash = bits
+		self.assertEqual(image_hash - imagehash.ImageHash(self.arrays[3]), 1)
+
+	def test_pickle(self):
+		for array in self.arrays:
+			image_hash = imagehash.ImageHash(array)
+			self.assertEqual(pickle.loads(pickle.dumps(image_hash)), image_hash)
+		# state of hashes pickled before the packed representation
+		image_hash = imagehash.ImageHash.__new__(imagehash.ImageHash)
+		image_hash.__setstate__({'hash': self.arrays[1]})
+		self.assertEqual(image_hash, imagehash.ImageHash(self.arrays[1]))
+
+
+if __name__ == '__main__':
+	unittest.main()
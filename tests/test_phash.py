@@ -1,11 +1,39 @@
 from __future__ import absolute_import, division, print_function
 
+import sys
 import unittest
+from unittest import mock
+
+import numpy
+from PIL import Image
 
 import imagehash
+import imagehash.batch
 
 from .utils import TestImageHash
 
+# phash of previous versions (computed with scipy.fftpack) of images whose
+# low frequency DCT coefficients tie at the median
+TIE_HASHES = {
+	'symmetric': ['8747', '8f76557892e0c9a2', 'af817e2ed538784bda57e350c93ca6eda1261d5863b92e6573614b9658869938'],
+	'gradient': ['8753', '80225422042a5400', '8a2823cf5e793145a4792bcfe628548f456b7cc5aa91282def98555245857df3'],
+	'blocks': ['a996', 'a51b8f4600b170e4', 'a5a513938f0f4e4e1e0fb9397878ec6cd0d01393870746c61f0fb9397878ec6c'],
+}
+
+
+def _tie_images():
+	# transpose-symmetric noise, a diagonal gradient and symmetric blocks, where dct[i, j] == dct[j, i]
+	rng = numpy.random.RandomState(0)
+	noise = rng.randint(0, 256, size=(32, 32))
+	rows, cols = numpy.indices((64, 64))
+	block = rng.randint(0, 256, size=(4, 4))
+	images = {
+		'symmetric': numpy.triu(noise) + numpy.triu(noise, 1).T,
+		'gradient': 255 * (rows + cols) // 126,
+		'blocks': numpy.kron(numpy.triu(block) + numpy.triu(block, 1).T, numpy.ones((8, 8), dtype=int)),
+	}
+	return {name: Image.fromarray(pixels.astype(numpy.uint8)) for name, pixels in images.items()}
+
 
 class Test(TestImageHash):
 	def setUp(self):
@@ -24,6 +52,66 @@ class Test(TestImageHash):
 	def test_phash_size(self):
 		self.check_hash_size(self.func, self.image)
 
+	def test_phash_lowfreq_dct(self):
+		try:
+			import scipy.fftpack
+		except ImportError:
+			self.skipTest('scipy is not installed')
+		rng = numpy.random.RandomState(42)
+		half = rng.randint(0, 256, size=(32, 16))
+		grids = [
+			numpy.asarray(self.image.convert('L').resize((32, 32), imagehash.ANTIALIAS)),
+			numpy.asarray(self.get_data_image('peppers.png').convert('L').resize((64, 64), imagehash.ANTIALIAS)),
+			numpy.full((32, 32), 77),
+			numpy.hstack([half, half[:, ::-1]]),
+		] + [rng.randint(0, 256, size=(32, 32)) for _ in range(20)]
+		for grid in grids:
+			grid = grid.astype(numpy.uint8)
+			for hash_size in (2, 8, 16):
+				expected = scipy.fftpack.dct(scipy.fftpack.dct(grid, axis=0), axis=1)[:hash_size, :hash_size]
+				dct = imagehash._dct_lowfreq(grid, hash_size)
+				self.assertTrue(numpy.allclose(dct, expected, rtol=1e-9, atol=1e-6))
+				self.assertTrue(numpy.array_equal(dct > numpy.median(dct), expected > numpy.median(expected)))
+
+	def test_phash_ties(self):
+		try:
+			import scipy.fftpack  # noqa: F401
+		except ImportError:
+			self.skipTest('scipy is not installed')
+		for name, image in _tie_images().items():
+			for hash_size, expected in zip((4, 8, 16), TIE_HASHES[name]):
+				self.assertEqual(str(imagehash.phash(image, hash_size)), expected)
+				self.assertEqual(str(imagehash.batch.phash([image, image], hash_size)[1]), expected)
+				# without scipy, tied coefficients are all below the median
+				with mock.patch.dict(sys.modules, {'scipy': None, 'scipy.fftpack': None}):
+					image_hash = imagehash.phash(image, hash_size)
+				self.assertLessEqual(image_hash - imagehash.hex_to_hash(expected), 2)
+
+	def test_phash_simple(self):
+		try:
+			import scipy.fftpack
+		except ImportError:
+			self.skipTest('scipy is not installed')
+		rng = numpy.random.RandomState(42)
+		images = [self.image, self.image.rotate(-1), self.get_data_image('peppers.png')]
+		images += [Image.fromarray(rng.randint(0, 256, size=(50, 40)).astype(numpy.uint8)) for _ in range(10)]
+		# flat images and images whose rows are each one colour, where all coefficients vanish
+		images += [Image.new('RGB', (100, 100), 'white'), Image.new('L', (30, 70), 77)]
+		images += [
+			Image.fromarray(rng.randint(0, 256, size=(height, 1)).repeat(width, axis=1).astype(numpy.uint8))
+			for height, width in ((100, 100), (37, 5), (8, 64))
+		]
+		# images whose coefficients are equal in exact arithmetic, so that round-off could pick the bits
+		images += list(_tie_images().values())
+		rows, cols = numpy.indices((45, 45))
+		images += [Image.fromarray(pixels.astype(numpy.uint8)) for pixels in (rows + cols, 5 * cols, 255 - 5 * rows)]
+		for image in images:
+			for hash_size in (4, 8, 16):
+				pixels = numpy.asarray(image.convert('L').resize((hash_size * 4, hash_size * 4), imagehash.ANTIALIAS))
+				dctlowfreq = scipy.fftpack.dct(pixels)[:hash_size, 1:hash_size + 1]
+				expected = imagehash.ImageHash(dctlowfreq > dctlowfreq.mean())
+				self.assertEqual(imagehash.phash_simple(image, hash_size), expected)
+
 
 if __name__ == '__main__':
 	unittest.main()
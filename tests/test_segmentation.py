@@ -0,0 +1,128 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy
+from PIL import ImageFilter
+
+import imagehash
+
+from .utils import TestImageHash
+
+
+def _find_region(remaining_pixels, segmented_pixels):
+	# the original set based flood fill of crop_resistant_hash, as reference
+	in_region = set()
+	not_in_region = set()
+	available_pixels = numpy.transpose(numpy.nonzero(remaining_pixels))
+	start = tuple(available_pixels[0])
+	in_region.add(start)
+	new_pixels = in_region.copy()
+	while True:
+		try_next = set()
+		for x, y in new_pixels:
+			try_next.update([(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)])
+		try_next.difference_update(segmented_pixels, not_in_region)
+		if not try_next:
+			break
+		new_pixels = set()
+		for pixel in try_next:
+			if remaining_pixels[pixel]:
+				in_region.add(pixel)
+				new_pixels.add(pixel)
+				segmented_pixels.add(pixel)
+			else:
+				not_in_region.add(pixel)
+	return in_region
+
+
+def _reference_segments(pixels, segment_threshold, min_segment_size):
+	img_width, img_height = pixels.shape
+	threshold_pixels = pixels > segment_threshold
+	unassigned_pixels = numpy.full(pixels.shape, True, dtype=bool)
+	segments = []
+	already_segmented = set()
+	already_segmented.update([(-1, z) for z in range(img_height)])
+	already_segmented.update([(z, -1) for z in range(img_width)])
+	already_segmented.update([(img_width, z) for z in range(img_height)])
+	already_segmented.update([(z, img_height) for z in range(img_width)])
+	while numpy.bitwise_and(threshold_pixels, unassigned_pixels).any():
+		segment = _find_region(numpy.bitwise_and(threshold_pixels, unassigned_pixels), already_segmented)
+		if len(segment) > min_segment_size:
+			segments.append(segment)
+		for pix in segment:
+			unassigned_pixels[pix] = False
+	threshold_pixels_i = numpy.invert(threshold_pixels)
+	while len(already_segmented) < img_width * img_height:
+		segment = _find_region(numpy.bitwise_and(threshold_pixels_i, unassigned_pixels), already_segmented)
+		if len(segment) > min_segment_size:
+			segments.append(segment)
+		for pix in segment:
+			unassigned_pixels[pix] = False
+	return segments
+
+
+class Test(TestImageHash):
+	def setUp(self):
+		self.grids = []
+		for name in ('imagehash.png', 'peppers.png'):
+			image = self.get_data_image(name).convert('L')
+			for size in (50, 300):
+				image = image.resize((size, size), imagehash.ANTIALIAS)
+				image = image.filter(ImageFilter.GaussianBlur()).filter(ImageFilter.MedianFilter())
+				self.grids.append(numpy.array(image).astype(numpy.float32))
+
+	def check_segments(self, pixels, segment_threshold, min_segment_size):
+		expected = _reference_segments(pixels, segment_threshold, min_segment_size)
+		segments = imagehash._find_all_segments(pixels, segment_threshold, min_segment_size)
+		self.assertEqual(segments, expected)
+
+	def test_images(self):
+		for pixels in self.grids:
+			for segment_threshold in (20, 128, 200):
+				for min_segment_size in (0, 10, 500):
+					self.check_segments(pixels, segment_threshold, min_segment_size)
+
+	def test_noise(self):
+		# many single pixel regions, so that the last valleys are not visited
+		rng = numpy.random.RandomState(8)
+		for shape in [(10, 10), (20, 13), (40, 40)]:
+			for density in (0.2, 0.5):
+				pixels = (rng.rand(*shape) < density) * 255.
+				for min_segment_size in (0, 1, 3):
+					self.check_segments(pixels, 128, min_segment_size)
+
+	def test_connected_components(self):
+		mask = numpy.array([
+			[1, 1, 0, 1],
+			[0, 1, 0, 1],
+			[1, 1, 1, 1],
+			[0, 0, 0, 0],
+		], dtype=bool)
+		expected = numpy.array([
+			[0, 0, 2, 0],
+			[4, 0, 2, 0],
+			[0, 0, 0, 0],
+			[12, 12, 12, 12],
+		])
+		self.assertTrue(numpy.array_equal(imagehash._connected_components(mask), expected))
+
+	def test_scipy_components(self):
+		try:
+			import scipy.ndimage
+		except ImportError:
+			self.skipTest('scipy is not installed')
+		rng = numpy.random.RandomState(9)
+		for mask in [pixels > 128 for pixels in self.grids] + list(rng.rand(10, 30, 20) < 0.5):
+			# reference: the first pixel of each region labelled by scipy
+			expected = numpy.zeros(mask.shape, dtype=int)
+			for value in (mask, ~mask):
+				labels, count = scipy.ndimage.label(value)
+				for label in range(1, count + 1):
+					region = labels == label
+					expected[region] = numpy.flatnonzero(region)[0]
+			self.assertTrue(numpy.array_equal(imagehash._connected_components(mask), expected))
+
+
+if __name__ == '__main__':
+	unittest.main()
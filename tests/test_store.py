@@ -0,0 +1,90 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import imagehash
+import imagehash.store
+
+
+class Test(unittest.TestCase):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmpdir, 'hashes.bin')
+		rng = numpy.random.RandomState(6)
+		self.hashes = [imagehash.ImageHash(bits) for bits in rng.rand(500, 8, 8) > 0.5]
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def test_roundtrip(self):
+		for shape in [(8, 8), (1, 42), (16, 16)]:
+			hashes = [imagehash.ImageHash(bits) for bits in numpy.random.RandomState(7).rand(100, *shape) > 0.5]
+			imagehash.store.write_store(self.path, hashes, algorithm='phash', metadata={'hash_size': shape[0]})
+			store = imagehash.store.open_store(self.path)
+			self.assertEqual(len(store), len(hashes))
+			self.assertEqual(store.hash_shape, shape)
+			self.assertEqual(store.algorithm, 'phash')
+			self.assertEqual(store.metadata['hash_size'], shape[0])
+			self.assertIsNone(store.ids)
+			self.assertEqual(list(store.hashes), hashes)
+			self.assertEqual(store[3], hashes[3])
+			self.assertIsInstance(store.hashes._data.base, numpy.memmap)
+			del store
+
+	def test_ids_and_search(self):
+		ids = numpy.arange(len(self.hashes)) * 10
+		imagehash.store.write_store(self.path, imagehash.HashArray(self.hashes), ids=ids)
+		store = imagehash.store.open_store(self.path)
+		self.assertTrue(numpy.array_equal(store.ids, ids))
+		self.assertEqual(list(store.hashes), self.hashes)
+		query = self.hashes[5]
+		expected = [query - other for other in self.hashes]
+		self.assertTrue(numpy.array_equal(store.hashes.distances(query), expected))
+		indices, _ = imagehash.MultiIndexHash(store.hashes).search(query, 20)
+		self.assertEqual(sorted(indices), [i for i, distance in enumerate(expected) if distance <= 20])
+
+	def test_incremental(self):
+		with imagehash.store.HashStoreWriter(self.path, (8, 8), algorithm='dhash', ids=True) as writer:
+			for i, image_hash in enumerate(self.hashes[:100]):
+				writer.append(image_hash, id=i)
+			writer.flush()
+			self.assertEqual(len(imagehash.store.open_store(self.path)), 100)
+			writer.extend(self.hashes[100:300], ids=range(100, 300))
+			# not flushed yet, so readers only see the first hashes
+			self.assertEqual(len(imagehash.store.open_store(self.path)), 100)
+		with imagehash.store.HashStoreWriter(self.path, append=True) as writer:
+			writer.extend(self.hashes[300:], ids=range(300, 500))
+			with self.assertRaises(ValueError):
+				writer.extend(self.hashes[:2], ids=[1])
+			with self.assertRaises(TypeError):
+				writer.append(imagehash.ImageHash(numpy.zeros((4, 4), dtype=bool)), id=0)
+		store = imagehash.store.open_store(self.path)
+		self.assertEqual(store.algorithm, 'dhash')
+		self.assertEqual(list(store.hashes), self.hashes)
+		self.assertEqual(list(store.ids), list(range(500)))
+
+	def test_empty(self):
+		imagehash.store.write_store(self.path, imagehash.HashArray(hash_shape=(8, 8)))
+		store = imagehash.store.open_store(self.path)
+		self.assertEqual(len(store), 0)
+		self.assertEqual(len(store.hashes.within(self.hashes[0], 5)), 0)
+
+	def test_invalid(self):
+		with open(self.path, 'w') as f:
+			f.write('\n'.join(str(image_hash) for image_hash in self.hashes))
+		with self.assertRaises(ValueError):
+			imagehash.store.open_store(self.path)
+		with self.assertRaises(ValueError):
+			imagehash.store.HashStoreWriter(self.path)
+		imagehash.store.write_store(self.path, self.hashes)
+		with self.assertRaises(ValueError):
+			imagehash.store.HashStoreWriter(self.path, (16, 16), append=True)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -26,6 +26,47 @@ class TestBasic(TestImageHash):
 		self.check_hash_stored(self.func, self.image, sizes=[2, 4, 8, 16, 32, 64])
 
 
+class TestMaxImageScale(TestImageHash):
+	def setUp(self):
+		self.images = []
+		for name in ('imagehash.png', 'peppers.png'):
+			image = self.get_data_image(name).convert('RGB')
+			self.images += [image, image.rotate(5), image.resize((1200, 900), Image.BICUBIC)]
+
+	def test_uncapped(self):
+		# the cheap operations give the same hashes when the image scale is not capped
+		for image in self.images:
+			for mode in ('haar', 'db4'):
+				for hash_size in (8, 16):
+					expected = imagehash.whash(image, hash_size=hash_size, mode=mode)
+					image_hash = imagehash.whash(image, hash_size=hash_size, mode=mode, max_image_scale=2**12)
+					self.assertEqual(image_hash, expected)
+
+	def test_capped(self):
+		# Haar LL coefficients are block means, which hardly change with the image scale:
+		# on the test images, 8x8 hashes agree with the default ones, while 16x16 hashes
+		# (only 4x4 pixels per bit at scale 64) may differ in up to 5% of the bits
+		for image in self.images:
+			for max_image_scale in (64, 256):
+				expected = imagehash.whash(image)
+				self.assertEqual(imagehash.whash(image, max_image_scale=max_image_scale), expected)
+				expected = imagehash.whash(image, hash_size=16)
+				image_hash = imagehash.whash(image, hash_size=16, max_image_scale=max_image_scale)
+				self.assertLessEqual(image_hash - expected, 0.05 * len(expected))
+		# db4 coefficients depend on the image scale, so the cap should not be too small
+		for image in self.images:
+			expected = imagehash.whash(image, mode='db4')
+			image_hash = imagehash.whash(image, mode='db4', max_image_scale=512)
+			self.assertLessEqual(image_hash - expected, 0.1 * len(expected))
+
+	def test_image_scale(self):
+		image = self.images[2]
+		self.assertEqual(imagehash.whash(image, max_image_scale=64), imagehash.whash(image, image_scale=64, max_image_scale=64))
+		self.assertEqual(imagehash.whash(image, hash_size=16, max_image_scale=8).hash.shape, (16, 16))
+		with six.assertRaisesRegex(self, AssertionError, 'max_image_scale is not power of 2'):
+			imagehash.whash(image, max_image_scale=100)
+
+
 class Test(unittest.TestCase):
 	def setUp(self):
 		self.image = self._get_white_image()